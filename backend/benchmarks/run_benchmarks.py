@@ -0,0 +1,264 @@
+"""Benchmark the log analysis pipeline stage by stage on synthetic logs.
+
+Run from the ``backend`` directory::
+
+    python -m benchmarks.run_benchmarks --sizes 1000,100000 --out bench.json
+    python -m benchmarks.run_benchmarks --sizes 1000 --baseline bench.json
+
+Each stage is timed with ``perf_counter`` and its peak Python heap
+allocation is recorded with ``tracemalloc`` (TensorFlow's native buffers
+are not traced, so the process peak RSS is reported as well).
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from models.detectors import DETECTORS, create_detector, resolve_detector_name
+from services.ingest import load_log_file
+from services.schema import infer_column_types, convert_columns
+from services.log_analyzer import calculate_column_stats, preprocess_dynamic_data, make_sequences
+from sklearn.preprocessing import StandardScaler
+from benchmarks.synthetic import GENERATORS
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+SEQUENCE_LENGTH = 10
+
+class StageTimer:
+    """Collects wall time and peak traced memory for named pipeline stages."""
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            result = {'seconds': round(elapsed, 6)}
+            if self.trace_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                result['peak_traced_mb'] = round(peak / 2**20, 3)
+            result['max_rss_mb'] = round(_max_rss_mb(), 1)
+            self.stages[name] = result
+
+def _max_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    return rss / 2**20 if sys.platform == 'darwin' else rss / 1024
+
+def detection_metrics(flags, truth_rows, n_rows, sequence_length):
+    """Window-level precision and row-level recall against injected anomalies.
+
+    A flagged window is a true positive when any of its rows was injected;
+    an injected row is recalled when at least one flagged window covers it.
+    """
+    is_anomaly = np.zeros(n_rows, dtype=np.int64)
+    is_anomaly[truth_rows] = 1
+    cumulative = np.concatenate([[0], np.cumsum(is_anomaly)])
+    window_hits = cumulative[sequence_length:] - cumulative[:-sequence_length]
+    flagged = np.asarray(flags).astype(bool)
+
+    true_positives = int(np.count_nonzero(window_hits[flagged] > 0))
+    flagged_count = int(np.count_nonzero(flagged))
+
+    # Mark every row covered by a flagged window
+    coverage = np.zeros(n_rows + 1, dtype=np.int64)
+    starts = np.flatnonzero(flagged)
+    np.add.at(coverage, starts, 1)
+    np.add.at(coverage, starts + sequence_length, -1)
+    covered = np.cumsum(coverage[:-1]) > 0
+    recalled = int(np.count_nonzero(covered[truth_rows]))
+
+    precision = true_positives / flagged_count if flagged_count else 0.0
+    recall = recalled / len(truth_rows) if len(truth_rows) else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        'flagged_windows': flagged_count,
+        'injected_rows': int(len(truth_rows)),
+        'precision': round(precision, 4),
+        'recall': round(recall, 4),
+        'f1': round(f1, 4)
+    }
+
+def benchmark_file(path, truth_rows, epochs, max_train_windows, trace_memory=True, detector='lstm'):
+    """Run every pipeline stage on one file and return timings and detection metrics."""
+    timer = StageTimer(trace_memory)
+
+    with timer.stage('parse'):
+        df = load_log_file(path)
+    with timer.stage('schema'):
+        column_types = infer_column_types(df)
+        converted = convert_columns(df, column_types)
+    with timer.stage('calculate_column_stats'):
+        calculate_column_stats(df, column_types, converted)
+    with timer.stage('preprocess_dynamic_data'):
+        features, _ = preprocess_dynamic_data(df, column_types, converted=converted)
+    with timer.stage('windowing'):
+        scaler = StandardScaler()
+        sequences = make_sequences(scaler.fit_transform(features), SEQUENCE_LENGTH)
+
+    # Train a fresh model so registry hits from earlier runs do not skew timings
+    detector = resolve_detector_name(detector, len(df), features.shape[1], SEQUENCE_LENGTH)
+    model = create_detector(detector, SEQUENCE_LENGTH, features.shape[1])
+    model.scaler = scaler
+    train_windows = sequences[:max_train_windows] if max_train_windows else sequences
+    with timer.stage('train'):
+        model.train(train_windows, epochs=epochs, calibrate=False)
+    with timer.stage('score'):
+        scored = model.score(sequences, update_threshold=True)
+
+    return {
+        'detector': detector,
+        'rows': int(len(df)),
+        'columns': int(len(df.columns)),
+        'bytes': os.path.getsize(path),
+        'windows': int(len(sequences)),
+        'train_windows': int(len(train_windows)),
+        'stages': timer.stages,
+        'detection': detection_metrics(scored['anomalies'], truth_rows, len(df), SEQUENCE_LENGTH)
+    }
+
+def compare_runs(runs, baseline_runs, tolerance):
+    """Flag stages that got slower than the baseline by more than ``tolerance``."""
+    baseline = {(run['format'], run['rows'], run.get('detector', 'lstm')): run for run in baseline_runs}
+    comparisons = []
+    for run in runs:
+        previous = baseline.get((run['format'], run['rows'], run.get('detector', 'lstm')))
+        if previous is None:
+            continue
+        for stage, timing in run['stages'].items():
+            before = previous['stages'].get(stage, {}).get('seconds')
+            if not before:
+                continue
+            ratio = timing['seconds'] / before
+            comparisons.append({
+                'format': run['format'],
+                'rows': run['rows'],
+                'detector': run.get('detector', 'lstm'),
+                'stage': stage,
+                'baseline_seconds': before,
+                'seconds': timing['seconds'],
+                'ratio': round(ratio, 3),
+                'regression': ratio > 1 + tolerance
+            })
+    return comparisons
+
+def generate_dataset(fmt, rows, seed, anomaly_rate, data_dir):
+    """Generate (or reuse) a synthetic file and its ground-truth anomaly rows."""
+    generator, extension = GENERATORS[fmt]
+    stem = os.path.join(data_dir, f"{fmt}-{rows}-s{seed}-r{anomaly_rate}")
+    path, truth_path = stem + extension, stem + '.truth.npy'
+    if os.path.exists(path) and os.path.exists(truth_path):
+        return path, np.load(truth_path)
+    truth = generator(path, rows, seed=seed, anomaly_rate=anomaly_rate)
+    np.save(truth_path, truth)
+    return path, truth
+
+def run_benchmarks(sizes, formats, seed=0, anomaly_rate=0.01, epochs=1,
+                   max_train_windows=50000, data_dir=None, trace_memory=True, detectors=('lstm',)):
+    """Benchmark every format, size and detector and return the JSON report."""
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = data_dir or tmp_dir
+        os.makedirs(data_dir, exist_ok=True)
+        for fmt in formats:
+            for rows in sizes:
+                print(f"Benchmarking {fmt} at {rows} rows...", file=sys.stderr)
+                start = time.perf_counter()
+                path, truth = generate_dataset(fmt, rows, seed, anomaly_rate, data_dir)
+                generate_seconds = time.perf_counter() - start
+                for detector in detectors:
+                    run = benchmark_file(path, truth, epochs, max_train_windows, trace_memory, detector)
+                    run.update({'format': fmt, 'generate_seconds': round(generate_seconds, 6)})
+                    runs.append(run)
+
+    return {
+        'meta': {
+            'created_at': pd.Timestamp.now(tz='UTC').isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'seed': seed,
+            'anomaly_rate': anomaly_rate,
+            'sequence_length': SEQUENCE_LENGTH,
+            'epochs': epochs,
+            'max_train_windows': max_train_windows,
+            'trace_memory': trace_memory
+        },
+        'runs': runs
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the log analysis pipeline")
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help="comma separated row counts, e.g. 1000,1e6")
+    parser.add_argument('--formats', default=','.join(GENERATORS),
+                        help=f"comma separated formats from: {', '.join(GENERATORS)}")
+    parser.add_argument('--detectors', default='lstm',
+                        help=f"comma separated engines from: auto, {', '.join(DETECTORS)}")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--anomaly-rate', type=float, default=0.01)
+    parser.add_argument('--epochs', type=int, default=1)
+    parser.add_argument('--max-train-windows', type=int, default=50000,
+                        help="cap on windows used for training (0 trains on all)")
+    parser.add_argument('--data-dir', help="keep generated files here and reuse them across runs")
+    parser.add_argument('--no-trace-memory', action='store_true',
+                        help="skip tracemalloc, which slows allocation-heavy stages")
+    parser.add_argument('--out', help="write the JSON report here instead of stdout")
+    parser.add_argument('--baseline', help="earlier JSON report to compare stage timings against")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="relative slowdown reported as a regression")
+    args = parser.parse_args(argv)
+
+    formats = [fmt.strip() for fmt in args.formats.split(',') if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in GENERATORS]
+    if unknown:
+        parser.error(f"unknown formats: {', '.join(unknown)}")
+    sizes = [int(float(size)) for size in args.sizes.split(',') if size.strip()]
+    detectors = [name.strip() for name in args.detectors.split(',') if name.strip()]
+    unknown = [name for name in detectors if name != 'auto' and name not in DETECTORS]
+    if unknown:
+        parser.error(f"unknown detectors: {', '.join(unknown)}")
+
+    report = run_benchmarks(
+        sizes, formats, seed=args.seed, anomaly_rate=args.anomaly_rate,
+        epochs=args.epochs, max_train_windows=args.max_train_windows,
+        data_dir=args.data_dir, trace_memory=not args.no_trace_memory, detectors=detectors
+    )
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        report['comparison'] = compare_runs(report['runs'], baseline.get('runs', []), args.tolerance)
+        regressions = [item for item in report['comparison'] if item['regression']]
+        for item in regressions:
+            print(f"Regression: {item['format']} {item['rows']} rows {item['detector']} {item['stage']} "
+                  f"{item['baseline_seconds']}s -> {item['seconds']}s", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
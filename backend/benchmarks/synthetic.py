@@ -0,0 +1,109 @@
+"""Seeded synthetic SOC log generator with injected anomalies.
+
+Every generator writes ``rows`` lines to ``path`` in fixed-size blocks (so
+1e7-row files can be produced without holding them in memory) and returns
+the sorted row indices of the injected anomalies as ground truth.
+"""
+import numpy as np
+import pandas as pd
+
+BLOCK_ROWS = 100000
+LEVELS = np.array(['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+LEVEL_WEIGHTS = [0.3, 0.55, 0.1, 0.05]
+START_TIME = pd.Timestamp('2024-12-29 00:00:00')
+
+def _anomaly_mask(rng, n, anomaly_rate):
+    return rng.random(n) < anomaly_rate
+
+def _timestamps(start_row, n):
+    seconds = np.arange(start_row, start_row + n) * 60
+    return (START_TIME + pd.to_timedelta(seconds, unit='s')).strftime('%Y-%m-%d %H:%M:%S.%f')
+
+def _metrics(rng, n, anomalies):
+    cpu = rng.normal(50, 8, n).clip(1, 100)
+    mem = rng.normal(60, 8, n).clip(1, 100)
+    req = rng.normal(200, 20, n).clip(0).round()
+    err = np.abs(rng.normal(0.01, 0.008, n))
+    k = int(anomalies.sum())
+    cpu[anomalies] = rng.uniform(95, 120, k)
+    mem[anomalies] = rng.uniform(90, 99, k)
+    req[anomalies] = rng.uniform(350, 400, k).round()
+    err[anomalies] = rng.uniform(0.1, 0.3, k)
+    return cpu, mem, req, err
+
+def generate_metric_log(path, rows, seed=0, anomaly_rate=0.01):
+    """``<timestamp> [LEVEL] CPU: x%, MEM: y%, REQ: n, ERR: e`` lines."""
+    rng = np.random.default_rng(seed)
+    truth = []
+    with open(path, 'w') as f:
+        for start in range(0, rows, BLOCK_ROWS):
+            n = min(BLOCK_ROWS, rows - start)
+            anomalies = _anomaly_mask(rng, n, anomaly_rate)
+            cpu, mem, req, err = _metrics(rng, n, anomalies)
+            levels = rng.choice(LEVELS, n, p=LEVEL_WEIGHTS)
+            levels[anomalies] = 'ERROR'
+            lines = (
+                pd.Series(_timestamps(start, n)) + ' [' + levels + '] CPU: '
+                + pd.Series(cpu).map('{:.2f}'.format) + '%, MEM: '
+                + pd.Series(mem).map('{:.2f}'.format) + '%, REQ: '
+                + pd.Series(req.astype(np.int64)).astype(str) + ', ERR: '
+                + pd.Series(err).map('{:.3f}'.format)
+            )
+            f.write('\n'.join(lines) + '\n')
+            truth.append(np.flatnonzero(anomalies) + start)
+    return np.concatenate(truth)
+
+def generate_json_log(path, rows, seed=0, anomaly_rate=0.01):
+    """JSON lines with metric, host and free-text message fields."""
+    rng = np.random.default_rng(seed)
+    hosts = np.array([f'host-{i:02d}' for i in range(16)])
+    messages = np.array(['request served', 'cache miss', 'user login', 'health check ok'])
+    truth = []
+    with open(path, 'w') as f:
+        for start in range(0, rows, BLOCK_ROWS):
+            n = min(BLOCK_ROWS, rows - start)
+            anomalies = _anomaly_mask(rng, n, anomaly_rate)
+            cpu, mem, req, err = _metrics(rng, n, anomalies)
+            latency = rng.gamma(2.0, 20.0, n)
+            latency[anomalies] = rng.uniform(800, 2000, int(anomalies.sum()))
+            frame = pd.DataFrame({
+                'timestamp': _timestamps(start, n),
+                'level': np.where(anomalies, 'ERROR', rng.choice(LEVELS, n, p=LEVEL_WEIGHTS)),
+                'host': rng.choice(hosts, n),
+                'cpu': cpu.round(2),
+                'mem': mem.round(2),
+                'requests': req.astype(np.int64),
+                'error_rate': err.round(4),
+                'latency_ms': latency.round(1),
+                'message': np.where(anomalies, 'upstream timeout', rng.choice(messages, n))
+            })
+            text = frame.to_json(orient='records', lines=True)
+            f.write(text if text.endswith('\n') else text + '\n')
+            truth.append(np.flatnonzero(anomalies) + start)
+    return np.concatenate(truth)
+
+def generate_wide_csv(path, rows, seed=0, anomaly_rate=0.01, numeric_columns=40, categorical_columns=10):
+    """A wide CSV of gaussian metrics and low-cardinality categorical columns."""
+    rng = np.random.default_rng(seed)
+    truth = []
+    for start in range(0, rows, BLOCK_ROWS):
+        n = min(BLOCK_ROWS, rows - start)
+        anomalies = _anomaly_mask(rng, n, anomaly_rate)
+        data = {'timestamp': _timestamps(start, n)}
+        for i in range(numeric_columns):
+            values = rng.normal(100, 10, n)
+            # Shift every third metric on anomalous rows
+            if i % 3 == 0:
+                values[anomalies] += rng.uniform(60, 90, int(anomalies.sum()))
+            data[f'metric_{i:02d}'] = values.round(3)
+        for i in range(categorical_columns):
+            data[f'category_{i:02d}'] = rng.choice([f'c{i}_{j}' for j in range(8)], n)
+        pd.DataFrame(data).to_csv(path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+        truth.append(np.flatnonzero(anomalies) + start)
+    return np.concatenate(truth)
+
+GENERATORS = {
+    'metrics': (generate_metric_log, '.log'),
+    'jsonl': (generate_json_log, '.jsonl'),
+    'csv': (generate_wide_csv, '.csv'),
+}
@@ -1,16 +1,34 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 import os
 from dotenv import load_dotenv
-import shutil
-from services.log_analyzer import analyze_logs
+from models.detectors import DEFAULT_DETECTOR, DETECTORS
+from services.storage import UPLOAD_DIR, content_store, cached_result, analyze_stored
+from services.jobs import job_manager, QueueFullError
+from services.batch import analyze_batch
+from services.anomaly_store import anomaly_store, analysis_key
+from services.commands import command_runner, command_args, CommandNotAllowedError, CommandLimitError
+from services.model_registry import model_registry
+from services.live import live_hub
+from services.inference import inference_service
+from services.metrics import metrics, record_analysis_metrics
+from services.response_format import (
+    RESPONSE_FORMATS, filter_anomalies, compact_results, pack_results, downsample_series
+)
+from services.llm_gateway import LLMGateway, anomaly_fingerprint
+from services.security_analysis import (
+    SAFETY_SETTINGS, build_security_prompt, parse_security_analysis,
+    default_security_analysis, error_security_analysis, stream_security_batch
+)
 import json
-import pandas as pd
 import logging
-import google.generativeai as genai
+import re
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 import asyncio
+import time
 
 # Load environment variables
 load_dotenv()
@@ -23,8 +41,16 @@ logger = logging.getLogger(__name__)
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if not GOOGLE_API_KEY:
     logger.warning("GOOGLE_API_KEY not found in environment variables")
-genai.configure(api_key=GOOGLE_API_KEY)
-model = genai.GenerativeModel('gemini-pro')
+# Preload registered models in the background once the server is up
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "true").lower() in ("1", "true", "yes")
+
+def create_gemini_model():
+    """Configure the Gemini client on first use; importing genai takes seconds."""
+    import google.generativeai as genai
+    genai.configure(api_key=GOOGLE_API_KEY)
+    return genai.GenerativeModel('gemini-pro')
+
+llm_gateway = LLMGateway(model_factory=create_gemini_model)
 
 app = FastAPI()
 
@@ -36,9 +62,26 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Compress large analysis responses for clients that accept gzip
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template rather than raw path to keep label cardinality bounded
+    route = request.scope.get("route")
+    metrics.observe(
+        "soc_http_request_seconds", time.perf_counter() - start, "HTTP request latency",
+        method=request.method, path=getattr(route, "path", "unmatched"), status=response.status_code
+    )
+    return response
+
+metrics.gauge("soc_analysis_queue_depth", job_manager.queue_depth, "Analysis jobs queued or running")
+metrics.gauge("soc_llm_cache_entries", lambda: len(llm_gateway.cache), "Entries in the LLM response cache")
+metrics.gauge("soc_live_sources", lambda: len(live_hub.sources), "Live ingestion sources")
 
 # Create uploads directory
-UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 class AnomalyAnalysisRequest(BaseModel):
@@ -52,6 +95,10 @@ class SecurityAnalysisRequest(BaseModel):
     score: float
     confidence: float
     severity: str
+    top_feature: Optional[str] = None
+
+class SecurityBatchRequest(BaseModel):
+    anomalies: List[SecurityAnalysisRequest]
 
 class CommandRequest(BaseModel):
     command: str
@@ -59,28 +106,296 @@ class CommandRequest(BaseModel):
 @app.post("/upload/")
 async def upload_file(file: UploadFile = File(...)):
     try:
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        return {"filename": file.filename}
+        file_path, content_hash = await content_store.store_upload(file)
+        return {"filename": file.filename, "content_hash": content_hash}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+async def warm_up_models():
+    try:
+        loaded = await asyncio.to_thread(model_registry.preload)
+        logger.info(f"Preloaded {loaded} registered models")
+    except Exception as e:
+        logger.error(f"Error preloading models: {str(e)}")
+
+@app.on_event("startup")
+async def start_warm_up():
+    # Runs as a task so startup, and with it /health, does not wait for TensorFlow
+    if MODEL_WARMUP:
+        app.state.warm_up_task = asyncio.create_task(warm_up_models())
+
+@app.on_event("shutdown")
+async def shutdown_jobs():
+    job_manager.shutdown()
+    inference_service.shutdown()
+
+def render_results(results, response_format="full", anomaly_offset=0, anomaly_limit=None,
+                   min_severity=None, include_metrics=False, max_points=None, start=None, end=None,
+                   downsample="lttb"):
+    """Apply series zoom/downsampling, anomaly filtering/pagination and the response format."""
+    if not include_metrics:
+        results = {key: value for key, value in results.items() if key != "metrics"}
+    if response_format not in RESPONSE_FORMATS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown format '{response_format}'. Use one of: {', '.join(RESPONSE_FORMATS)}"
+        )
+    try:
+        if max_points is not None or start is not None or end is not None:
+            results = downsample_series(results, max_points, start, end, downsample)
+        results = filter_anomalies(results, min_severity, anomaly_offset, anomaly_limit)
+        if response_format == "msgpack":
+            return Response(content=pack_results(results), media_type="application/x-msgpack")
+    except (ValueError, RuntimeError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if response_format == "compact":
+        return compact_results(results)
+    return results
+
+def analysis_options(detector, source=None):
+    """Validate per-request analysis options; they also key the result cache."""
+    detector = (detector or DEFAULT_DETECTOR).lower()
+    if detector != "auto" and detector not in DETECTORS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown detector '{detector}'. Use one of: auto, {', '.join(DETECTORS)}"
+        )
+    options = {"detector": detector}
+    if source:
+        # Opt in to a per-source model that is fine-tuned on every upload
+        options["source"] = source
+    return options
+
+def record_batch_metrics(report):
+    for file_metrics in report.get("metrics", {}).get("file_metrics", []):
+        record_analysis_metrics(file_metrics)
+
+def store_anomalies(analysis_id, results, source=None, file=None, content_hash=None):
+    """Persist an analysis to the anomaly store; failures only cost the history."""
+    try:
+        anomaly_store.save(analysis_id, results, source=source, file=file, content_hash=content_hash)
+    except Exception as e:
+        logger.error(f"Error storing anomalies: {str(e)}")
+
 @app.post("/analyze/")
-async def analyze_file(file: UploadFile = File(...)):
+async def analyze_file(
+    file: UploadFile = File(...),
+    response_format: str = Query("full", alias="format"),
+    anomaly_offset: int = Query(0, ge=0),
+    anomaly_limit: Optional[int] = Query(None, ge=1),
+    min_severity: Optional[str] = None,
+    include_metrics: bool = False,
+    detector: Optional[str] = None,
+    source: Optional[str] = None,
+    max_points: Optional[int] = Query(None, ge=3),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    downsample: str = "lttb"
+):
+    """Analyze an uploaded log.
+
+    ``max_points`` downsamples the score series for charts (anomalous windows
+    are always kept) and ``start``/``end`` zoom into a window or time range;
+    re-fetch other ranges at full resolution from ``/results/{content_hash}``.
+    """
+    options = analysis_options(detector, source)
     try:
-        # Save the uploaded file
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        # Stream the upload to content-addressed storage
+        file_path, content_hash = await content_store.store_upload(file)
         
-        # Analyze the file
-        results = analyze_logs(file_path)
-        return results
+        # Reuse the cached result for known content, otherwise analyze in the worker pool
+        results = None if source else cached_result(content_hash, options)
+        cached = results is not None
+        if not source:
+            metrics.inc("soc_result_cache_requests_total", help_text="Analysis result cache lookups",
+                        result="hit" if cached else "miss")
+        if not cached:
+            results = await job_manager.run(analyze_stored, file_path, content_hash, **options)
+            record_analysis_metrics(results.get("metrics"))
+            # Persist in the background so large result sets do not delay the response
+            asyncio.get_running_loop().run_in_executor(
+                None, store_anomalies, analysis_key(content_hash, options), results,
+                source, file.filename, content_hash
+            )
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        raise HTTPException(status_code=422, detail=str(e))
+    if include_metrics and "metrics" in results:
+        results["metrics"] = dict(results["metrics"], cached=cached)
+    if not source:
+        results = dict(results, content_hash=content_hash)
+    return render_results(
+        results, response_format, anomaly_offset, anomaly_limit, min_severity, include_metrics,
+        max_points, start, end, downsample
+    )
+
+@app.post("/jobs/analyze", status_code=202)
+async def submit_analysis_job(
+    file: UploadFile = File(...),
+    detector: Optional[str] = None,
+    source: Optional[str] = None
+):
+    options = analysis_options(detector, source)
+    try:
+        file_path, content_hash = await content_store.store_upload(file)
+        job_id = job_manager.submit(analyze_stored, file_path, content_hash, **options)
+
+        def on_done(results):
+            record_analysis_metrics(results.get("metrics"))
+            store_anomalies(analysis_key(content_hash, options), results, source, file.filename, content_hash)
+        job_manager.add_done_callback(job_id, on_done)
+        status = job_manager.status(job_id)
+        status["content_hash"] = content_hash
+        return status
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/jobs/batch", status_code=202)
+async def submit_batch_job(
+    files: List[UploadFile] = File(...),
+    detector: Optional[str] = None
+):
+    """Analyze many logs (or zip/tar archives of logs) as one job with a merged report.
+
+    Files are sharded across the worker pool; fetch the report from
+    ``/jobs/{job_id}/result``.
+    """
+    options = analysis_options(detector)
+    try:
+        targets = []
+        for upload in files:
+            file_path, _ = await content_store.store_upload(upload)
+            targets.append((upload.filename or os.path.basename(file_path), file_path))
+        job_id = job_manager.submit_local(
+            analyze_batch, targets, job_manager.submit_waiting, detector=options["detector"],
+            max_in_flight=job_manager.max_workers, tmp_root=content_store.tmp_dir
+        )
+
+        def on_done(report):
+            record_batch_metrics(report)
+            store_anomalies(f"batch-{job_id}", report)
+        job_manager.add_done_callback(job_id, on_done)
+        status = job_manager.status(job_id)
+        status["files"] = len(targets)
+        return status
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    status = job_manager.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    status["queue_depth"] = job_manager.queue_depth()
+    return status
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(
+    job_id: str,
+    response_format: str = Query("full", alias="format"),
+    anomaly_offset: int = Query(0, ge=0),
+    anomaly_limit: Optional[int] = Query(None, ge=1),
+    min_severity: Optional[str] = None,
+    include_metrics: bool = False,
+    max_points: Optional[int] = Query(None, ge=3),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    downsample: str = "lttb"
+):
+    status = job_manager.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if status["status"] == "failed":
+        raise HTTPException(status_code=422, detail=status["error"])
+    if status["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is {status['status']}")
+    return render_results(
+        job_manager.result(job_id), response_format, anomaly_offset, anomaly_limit, min_severity,
+        include_metrics, max_points, start, end, downsample
+    )
+
+@app.get("/results/{content_hash}")
+async def get_cached_result(
+    content_hash: str,
+    detector: Optional[str] = None,
+    response_format: str = Query("full", alias="format"),
+    anomaly_offset: int = Query(0, ge=0),
+    anomaly_limit: Optional[int] = Query(None, ge=1),
+    min_severity: Optional[str] = None,
+    include_metrics: bool = False,
+    max_points: Optional[int] = Query(None, ge=3),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    downsample: str = "lttb"
+):
+    """Re-read an earlier analysis by content hash, e.g. to zoom into a range without re-analyzing."""
+    if not re.fullmatch(r"[0-9a-f]{64}", content_hash):
+        raise HTTPException(status_code=404, detail="No cached analysis for this content and detector")
+    options = analysis_options(detector)
+    results = await asyncio.to_thread(cached_result, content_hash, options)
+    if results is None:
+        raise HTTPException(status_code=404, detail="No cached analysis for this content and detector")
+    return render_results(
+        dict(results, content_hash=content_hash), response_format, anomaly_offset, anomaly_limit,
+        min_severity, include_metrics, max_points, start, end, downsample
+    )
+
+@app.get("/anomalies")
+async def list_anomalies(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    source: Optional[str] = None,
+    severity: Optional[str] = None,
+    min_score: Optional[float] = None,
+    order: str = "time",
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None
+):
+    """Page through stored anomalies by event time (or score with ``order=score``).
+
+    ``start``/``end`` are ISO-8601 or unix seconds; pass ``next_cursor`` as
+    ``cursor`` to fetch the following page.
+    """
+    try:
+        return await asyncio.to_thread(
+            anomaly_store.query, start, end, source, severity, min_score, order, limit, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@app.get("/anomalies/top")
+async def top_anomalies(
+    n: int = Query(20, ge=1, le=1000),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    source: Optional[str] = None,
+    severity: Optional[str] = None
+):
+    """Highest-scoring stored anomalies, optionally within a time range."""
+    try:
+        page = await asyncio.to_thread(
+            anomaly_store.query, start, end, source, severity, None, "score", n
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"anomalies": page["anomalies"]}
+
+@app.get("/anomalies/summary")
+async def anomaly_summary(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    severity: Optional[str] = None,
+    min_score: Optional[float] = None
+):
+    """Per-source anomaly counts, severity split, scores and first/last event time."""
+    try:
+        return await asyncio.to_thread(anomaly_store.summary, start, end, None, severity, min_score)
+    except ValueError as e:
         raise HTTPException(status_code=422, detail=str(e))
 
 @app.post("/analyze-anomaly")
@@ -102,11 +417,20 @@ async def analyze_anomaly(request: AnomalyAnalysisRequest):
         4. Prevention measures
         """
         
-        # Get response from Gemini
-        response = model.generate_content(prompt)
-        analysis = response.text
+        # Get response from Gemini, reusing answers for equivalent anomalies
+        analysis = await llm_gateway.generate(
+            prompt,
+            cache_key=anomaly_fingerprint('anomaly', request.context, request.severity, request.score)
+        )
+        if not analysis:
+            raise HTTPException(status_code=500, detail="No response from Gemini")
         
         return {"analysis": analysis}
+    except HTTPException:
+        raise
+    except asyncio.TimeoutError:
+        logger.error("Gemini analysis timed out")
+        raise HTTPException(status_code=504, detail="Gemini analysis timed out")
     except Exception as e:
         logger.error(f"Error in Gemini analysis: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -128,259 +452,191 @@ async def analyze_security(request: SecurityAnalysisRequest):
             raise HTTPException(status_code=422, detail="Severity is required")
 
         # Create a security-focused prompt for Gemini
-        prompt = f"""
-        Based on this system log anomaly, provide specific Windows commands to address and mitigate the security issues.
-
-        Input Data:
-        Context: {request.context}
-        Score: {request.score}
-        Confidence: {request.confidence}
-        Severity: {request.severity}
-
-        Please provide your analysis in this exact format:
-
-        THREAT ASSESSMENT
-        [Brief overview of the security threat]
-
-        IMPACT ANALYSIS
-        Risk Level: [Critical/High/Medium/Low]
-        Affected Components: [List components]
-        Potential Consequences: [List consequences]
-
-        MITIGATION COMMANDS
+        prompt = build_security_prompt(request)
 
-        Immediate Actions:
-        COMMAND: [Windows command]
-        DESCRIPTION: [What this command does]
-
-        System Hardening:
-        COMMAND: [Windows command]
-        DESCRIPTION: [What this command does]
-
-        Monitoring Setup:
-        COMMAND: [Windows command]
-        DESCRIPTION: [What this command does]
-
-        PREVENTION MEASURES
-        [1] [First measure]
-        [2] [Second measure]
-        [3] [Third measure]
-
-        Note: Provide only Windows-compatible commands that directly address the detected anomaly.
-        Include specific parameters and values, not placeholders.
-        """
-
-        # Get response from Gemini
-        response = model.generate_content(
+        # Get response from Gemini, reusing answers for equivalent anomalies
+        analysis = await llm_gateway.generate(
             prompt,
-            safety_settings={
-                "HARM_CATEGORY_DANGEROUS_CONTENT": "BLOCK_NONE",
-                "HARM_CATEGORY_HATE_SPEECH": "BLOCK_NONE",
-                "HARM_CATEGORY_HARASSMENT": "BLOCK_NONE",
-                "HARM_CATEGORY_SEXUALLY_EXPLICIT": "BLOCK_NONE"
-            }
+            cache_key=anomaly_fingerprint('security', request.context, request.severity, request.score),
+            safety_settings=SAFETY_SETTINGS
         )
-        
-        if not response:
-            raise HTTPException(
-                status_code=500, 
-                detail="Failed to get response from Gemini API"
-            )
 
         # Check if response has content
-        if not hasattr(response, 'text') or not response.text:
+        if not analysis:
             # Return a default analysis if Gemini fails
-            return {
-                "analysis": f"""
-THREAT ASSESSMENT
-High CPU ({request.context.get('CPU', 'N/A')}) and memory ({request.context.get('MEM', 'N/A')}) utilization detected.
-
-IMPACT ANALYSIS
-Risk Level: {request.severity}
-Affected Components: CPU, Memory, System Resources
-Potential Consequences: System performance degradation, potential service disruption
-
-PREVENTION MEASURES
-1. Monitor and terminate resource-intensive processes
-2. Update system security patches
-3. Review system logs for suspicious activities
-""".strip(),
-                "commands": [
-                    {
-                        "command": "tasklist /v",
-                        "description": "[Immediate Actions] Lists all running processes with their resource usage"
-                    },
-                    {
-                        "command": "wmic process where 'PercentProcessorTime > 50' get Caption,ProcessId,PercentProcessorTime",
-                        "description": "[Monitoring] Shows processes using more than 50% CPU"
-                    },
-                    {
-                        "command": "Get-EventLog -LogName System -EntryType Error -Newest 10",
-                        "description": "[Analysis] Retrieves recent system error logs for investigation"
-                    }
-                ]
-            }
+            return default_security_analysis(request)
 
         # Parse the response into structured sections
-        analysis = response.text
-        sections = {}
-        current_section = None
-        current_command = None
-        commands = []
-
-        for line in analysis.split('\n'):
-            line = line.strip()
-            if not line:
-                continue
-
-            # Handle main sections
-            if line in ['THREAT ASSESSMENT', 'IMPACT ANALYSIS', 'MITIGATION COMMANDS', 'PREVENTION MEASURES']:
-                current_section = line
-                sections[current_section] = []
-                continue
+        return parse_security_analysis(analysis)
+        
+    except Exception as e:
+        logger.error(f"Error in security analysis: {str(e)}")
+        # Return a simplified analysis in case of errors
+        return error_security_analysis(request)
 
-            # Handle command sections
-            if line.endswith(':') and line in ['Immediate Actions:', 'System Hardening:', 'Monitoring Setup:']:
-                current_command = line[:-1]
-                continue
+@app.post("/analyze-security/batch")
+async def analyze_security_batch(batch: SecurityBatchRequest):
+    if not batch.anomalies:
+        raise HTTPException(status_code=422, detail="At least one anomaly is required")
+    for request in batch.anomalies:
+        if not request.context or not request.severity:
+            raise HTTPException(status_code=422, detail="Context and severity are required")
 
-            if current_command and line.startswith('COMMAND:'):
-                cmd = line.replace('COMMAND:', '').strip()
-                continue
+    # Stream one NDJSON line per anomaly as each group of similar anomalies completes
+    return StreamingResponse(
+        stream_security_batch(llm_gateway, batch.anomalies),
+        media_type="application/x-ndjson"
+    )
 
-            if current_command and line.startswith('DESCRIPTION:'):
-                desc = line.replace('DESCRIPTION:', '').strip()
-                commands.append({
-                    'command': cmd,
-                    'description': f'[{current_command}] {desc}'
-                })
-                current_command = None
-                continue
+class CommandBatchRequest(BaseModel):
+    commands: List[str]
 
-            # Format prevention measures as a list
-            if current_section == 'PREVENTION MEASURES' and line.startswith('['):
-                # Keep the square brackets format from the input
-                sections[current_section].append(line)
-            else:
-                sections[current_section].append(line)
+def client_id(connection):
+    return connection.client.host if connection.client else "unknown"
 
-        # Format the analysis in a clean way
-        formatted_analysis = []
-        
-        if 'THREAT ASSESSMENT' in sections:
-            formatted_analysis.append('THREAT ASSESSMENT')
-            formatted_analysis.extend(sections['THREAT ASSESSMENT'])
-            formatted_analysis.append('')
-
-        if 'IMPACT ANALYSIS' in sections:
-            formatted_analysis.append('IMPACT ANALYSIS')
-            formatted_analysis.extend(sections['IMPACT ANALYSIS'])
-            formatted_analysis.append('')
-
-        if 'PREVENTION MEASURES' in sections:
-            formatted_analysis.append('PREVENTION MEASURES')
-            # Format prevention measures with proper numbering
-            measures = sections['PREVENTION MEASURES']
-            formatted_measures = []
-            for measure in measures:
-                if measure.startswith('[') and ']' in measure:
-                    # Extract the number and text
-                    number = measure[1:measure.index(']')]
-                    text = measure[measure.index(']')+1:].strip()
-                    formatted_measures.append(f"{number}. {text}")
-                else:
-                    formatted_measures.append(measure)
-            formatted_analysis.extend(formatted_measures)
-
-        return {
-            "analysis": '\n'.join(formatted_analysis),
-            "commands": commands
-        }
-        
-    except Exception as e:
-        logger.error(f"Error in security analysis: {str(e)}")
-        # Return a simplified analysis in case of errors
-        return {
-            "analysis": f"""
-THREAT ASSESSMENT
-Detected anomaly in system metrics.
-
-IMPACT ANALYSIS
-Risk Level: {request.severity}
-Affected Components: System Resources
-Potential Consequences: Performance impact
-
-PREVENTION MEASURES
-1. Monitor system resources
-2. Review security logs
-3. Update system security
-""".strip(),
-            "commands": [
-                {
-                    "command": "tasklist /v",
-                    "description": "[Basic Analysis] Lists all running processes"
-                }
-            ]
-        }
+def sse_event(event):
+    return f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
 
 @app.post("/execute-command")
-async def execute_command(request: CommandRequest):
+async def execute_command(request: CommandRequest, http_request: Request):
     try:
-        # IMPORTANT: Implement proper security validation here
-        # Only allow specific security-related commands
-        allowed_commands = {
-            "netsh advfirewall",
-            "wf.msc",
-            "netsh firewall",
-            "sc",
-            "reg"
-        }
-        
-        # Basic security check
-        command_base = request.command.split()[0].lower()
-        if not any(request.command.lower().startswith(cmd.lower()) for cmd in allowed_commands):
-            raise HTTPException(
-                status_code=400,
-                detail="Command not allowed. Only security configuration commands are permitted."
-            )
-        
-        # Execute command and capture output
-        process = await asyncio.create_subprocess_shell(
-            request.command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await process.communicate()
-        
-        if process.returncode == 0:
-            return {
-                "success": True,
-                "output": stdout.decode(),
-                "command": request.command
-            }
-        else:
-            return {
-                "success": False,
-                "error": stderr.decode(),
-                "command": request.command
-            }
+        return await command_runner.run(request.command, client_id(http_request))
+    except CommandNotAllowedError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except CommandLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         logger.error(f"Error executing command: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/execute-command/stream")
+async def execute_command_stream(request: CommandRequest, http_request: Request):
+    """Run a command and stream its output as Server-Sent Events, one per line."""
+    try:
+        command_args(request.command)
+    except CommandNotAllowedError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    events = command_runner.stream(request.command, client_id(http_request))
+    try:
+        # Start the command now so limit errors become a status code, not a broken stream
+        first = await events.__anext__()
+    except CommandLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    async def body():
+        try:
+            yield sse_event(first)
+            async for event in events:
+                yield sse_event(event)
+        finally:
+            # Kills the command if the client disconnected mid-stream
+            await events.aclose()
+    return StreamingResponse(body(), media_type="text/event-stream")
+
+@app.post("/execute-commands")
+async def execute_commands(batch: CommandBatchRequest, http_request: Request):
+    """Run several commands (e.g. every COMMAND of one /analyze-security response) in parallel."""
+    if not batch.commands:
+        raise HTTPException(status_code=422, detail="At least one command is required")
+    results = await command_runner.run_many(batch.commands, client_id(http_request))
+    return {"results": results}
+
+@app.websocket("/ws/execute")
+async def execute_websocket(websocket: WebSocket):
+    """Run ``{"command": ...}`` or ``{"commands": [...]}`` messages and stream their events."""
+    await websocket.accept()
+    client = client_id(websocket)
+    try:
+        while True:
+            message = await websocket.receive_json()
+            commands = message.get("commands") or [message.get("command")]
+            if not all(isinstance(command, str) and command for command in commands):
+                await websocket.send_json({"event": "error", "error": "Send a command or a list of commands"})
+                continue
+            async for event in command_runner.stream_many(commands, client):
+                await websocket.send_json(event)
+    except WebSocketDisconnect:
+        pass
+
 @app.get("/test-gemini")
 async def test_gemini():
     try:
         # Test the Gemini API with a simple prompt
-        response = model.generate_content("Hello! Please respond with a simple 'Hello, I'm working!'")
-        if response and response.text:
-            return {"status": "success", "message": response.text}
+        message = await llm_gateway.generate("Hello! Please respond with a simple 'Hello, I'm working!'")
+        if message:
+            return {"status": "success", "message": message}
         else:
             return {"status": "error", "message": "No response from Gemini"}
     except Exception as e:
         logger.error(f"Gemini test error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Gemini API error: {str(e)}")
 
+# Lines scored per batch when reading a chunked /ingest body
+INGEST_BATCH_LINES = 500
+
+@app.post("/ingest/{source}")
+async def ingest_lines(source: str, request: Request):
+    """Accept a chunked body of newline-delimited log lines and score them incrementally."""
+    try:
+        rows = 0
+        anomalies = []
+        pending = []
+        remainder = ""
+        async for chunk in request.stream():
+            lines = (remainder + chunk.decode("utf-8", errors="replace")).split("\n")
+            remainder = lines.pop()
+            pending.extend(lines)
+            if len(pending) >= INGEST_BATCH_LINES:
+                anomalies.extend(await live_hub.ingest(source, pending))
+                rows += len(pending)
+                pending = []
+        if remainder:
+            pending.append(remainder)
+        if pending:
+            anomalies.extend(await live_hub.ingest(source, pending))
+            rows += len(pending)
+        return {"source": source, "rows": rows, "anomalies": anomalies}
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@app.delete("/ingest/{source}")
+async def drop_live_source(source: str):
+    """Forget a live source's rolling window and stop its idle scoring worker."""
+    if source not in live_hub.sources:
+        raise HTTPException(status_code=404, detail=f"Unknown live source '{source}'")
+    live_hub.reset(source)
+    return {"source": source, "dropped": True}
+
+@app.websocket("/ws/ingest/{source}")
+async def ingest_websocket(websocket: WebSocket, source: str):
+    """Receive log lines over a WebSocket and reply with the anomalies each message completes."""
+    await websocket.accept()
+    try:
+        while True:
+            message = await websocket.receive_text()
+            try:
+                anomalies = await live_hub.ingest(source, message.splitlines())
+                await websocket.send_json({"source": source, "anomalies": anomalies})
+            except ValueError as e:
+                await websocket.send_json({"source": source, "error": str(e)})
+    except WebSocketDisconnect:
+        pass
+
+@app.websocket("/ws/anomalies")
+async def anomalies_websocket(websocket: WebSocket, source: Optional[str] = None):
+    """Push anomalies from live sources to the client as soon as they are detected."""
+    await websocket.accept()
+    queue = live_hub.subscribe()
+    try:
+        while True:
+            anomaly = await queue.get()
+            if source is None or anomaly["source"] == source:
+                await websocket.send_json(anomaly)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        live_hub.unsubscribe(queue)
+
 @app.get("/")
 async def root():
     return {"message": "Log Analysis API is running"}
@@ -389,6 +645,11 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Expose counters, latency histograms and queue depth in Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,388 @@
+import os
+import joblib
+import numpy as np
+
+DEFAULT_DETECTOR = os.getenv('DEFAULT_DETECTOR', 'lstm')
+# Rows per window; only files shorter than this use shorter windows
+SEQUENCE_LENGTH = 10
+# Windows sampled to fit the lightweight engines; scoring always covers every window
+DETECTOR_MAX_FIT_WINDOWS = int(os.getenv('DETECTOR_MAX_FIT_WINDOWS', 20000))
+# Below this many rows there is too little data for a learned detector
+DETECTOR_SMALL_ROWS = int(os.getenv('DETECTOR_SMALL_ROWS', 2000))
+# Metric streams with at most this many features are scored per feature
+DETECTOR_ZSCORE_MAX_FEATURES = int(os.getenv('DETECTOR_ZSCORE_MAX_FEATURES', 8))
+# Window sizes (sequence_length * n_features) above this use IsolationForest instead of PCA
+DETECTOR_PCA_MAX_DIMS = int(os.getenv('DETECTOR_PCA_MAX_DIMS', 256))
+# Weight kept by earlier batches each time the online threshold is updated
+THRESHOLD_DECAY = float(os.getenv('THRESHOLD_DECAY', 0.9))
+
+class StreamingQuantile:
+    """Online quantile estimate over a decayed log-scale histogram.
+
+    Each batch is folded in with one vectorized histogram call, so no
+    samples are stored and updates cost the same for any stream length.
+    Older batches are down-weighted by ``decay`` so the estimate can follow
+    slow drift without jumping with every new batch.
+    """
+
+    def __init__(self, quantile=0.95, decay=THRESHOLD_DECAY, low=1e-8, high=1e8, bins=2048):
+        self.quantile = quantile
+        self.decay = decay
+        self.edges = np.logspace(np.log10(low), np.log10(high), bins + 1)
+        # One extra bin on each side for values outside [low, high]
+        self.counts = np.zeros(bins + 2)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+        self.counts *= self.decay
+        self.counts += np.bincount(
+            np.searchsorted(self.edges, values, side='right'), minlength=len(self.counts)
+        )
+
+    def value(self):
+        """Return the current estimate, or None before any update."""
+        cumulative = np.cumsum(self.counts)
+        total = cumulative[-1]
+        if total <= 0:
+            return None
+        target = self.quantile * total
+        i = int(np.searchsorted(cumulative, target))
+        if i == 0:
+            return float(self.edges[0])
+        if i >= len(self.edges):
+            return float(self.edges[-1])
+        # Interpolate geometrically inside bin i, which spans edges[i - 1]..edges[i]
+        fraction = (target - cumulative[i - 1]) / self.counts[i]
+        low, high = self.edges[i - 1], self.edges[i]
+        return float(low * (high / low) ** fraction)
+
+class AnomalyDetector:
+    """Common scoring contract for window-based anomaly detectors.
+
+    Subclasses implement ``fit`` and ``_reconstruction_errors``, which returns
+    the per-feature error of each window as a ``(batch, n_features)`` array.
+    ``score`` turns those errors into the scores, flags, confidences and
+    feature errors the analysis pipeline consumes, identically for every
+    engine.
+    """
+
+    name = None
+
+    def __init__(self, sequence_length, n_features):
+        # sklearn is imported on first use so importing the engines stays cheap
+        from sklearn.preprocessing import StandardScaler
+        self.sequence_length = sequence_length
+        self.n_features = n_features
+        self.threshold = 0.7
+        self.scaler = StandardScaler()
+        # Online threshold and retraining state for incrementally updated models
+        self.threshold_estimator = None
+        self.baseline_error = None
+        self.updates_since_full_fit = 0
+
+    def fit(self, sequences):
+        raise NotImplementedError
+
+    def partial_fit(self, sequences, epochs=1, batch_size=32):
+        """Update the detector with new windows.
+
+        Engines without an incremental update refit on the new windows;
+        the online threshold still carries the earlier baseline.
+        """
+        self.fit(_as_windows(sequences))
+
+    def _reconstruction_errors(self, batch):
+        raise NotImplementedError
+
+    def train(self, sequences, epochs=None, batch_size=None, calibrate=True):
+        """Fit the detector on windows.
+
+        ``epochs`` and ``batch_size`` only apply to iterative engines and are
+        accepted so every detector can be trained the same way.
+        """
+        sequences = _as_windows(sequences)
+        self.fit(sequences)
+        if calibrate:
+            self.score(sequences, update_threshold=True)
+
+    def feature_errors(self, sequences, batch_size=1024):
+        """Return the ``(n_windows, n_features)`` error array, computed in batches.
+
+        Only one batch is ever copied out of a strided window view.
+        """
+        sequences = _as_windows(sequences)
+        feature_errors = np.empty((len(sequences), self.n_features), dtype=np.float32)
+        for start in range(0, len(sequences), batch_size):
+            batch = np.ascontiguousarray(sequences[start:start + batch_size])
+            feature_errors[start:start + len(batch)] = self._reconstruction_errors(batch)
+        return feature_errors
+
+    def score(self, sequences, update_threshold=False, batch_size=1024):
+        """Score sequences in batches.
+
+        Returns a dict with per-window ``scores``, ``anomalies`` and
+        ``confidence`` arrays plus ``feature_errors``, the error of each
+        feature averaged over the window.
+        """
+        return self.score_errors(self.feature_errors(sequences, batch_size), update_threshold)
+
+    def calibrate(self, feature_errors):
+        """Restart the online threshold from the errors of a full training pass."""
+        mse = np.mean(feature_errors, axis=1)
+        self.threshold_estimator = StreamingQuantile()
+        self.threshold_estimator.update(mse)
+        self.threshold = self.threshold_estimator.value()
+        self.baseline_error = float(np.median(mse))
+        self.updates_since_full_fit = 0
+
+    def update_threshold_online(self, feature_errors, count_update=True):
+        """Fold new errors into the online threshold instead of recomputing it.
+
+        ``count_update=False`` folds in more data of an update already counted.
+        """
+        if getattr(self, 'threshold_estimator', None) is None:
+            self.calibrate(feature_errors)
+            return
+        self.threshold_estimator.update(np.mean(feature_errors, axis=1))
+        self.threshold = self.threshold_estimator.value()
+        if count_update:
+            self.updates_since_full_fit += 1
+
+    def score_errors(self, feature_errors, update_threshold=False):
+        """Turn per-feature window errors into the ``score`` result.
+
+        Engines measure error on very different scales, so scores are
+        relative to the engine's own calibrated threshold: 0.5 at the
+        threshold and 0.8 at four times it.
+        """
+        mse = np.mean(feature_errors, axis=1)
+
+        if update_threshold:
+            self.threshold = float(np.percentile(mse, 95))  # Set threshold at 95th percentile
+
+        # Calculate distance from threshold
+        distances = np.abs(mse - self.threshold)
+        max_distance = max(np.max(distances), 1e-10) if len(distances) else 1e-10  # Avoid division by zero
+        threshold = max(float(self.threshold), 1e-10)
+
+        return {
+            'scores': (mse / (mse + threshold)).astype(np.float32),
+            'anomalies': (mse > self.threshold).astype(np.float32),
+            'confidence': _sigmoid(distances / max_distance),
+            'feature_errors': feature_errors
+        }
+
+    def save_model(self, path):
+        """Save the fitted detector, its scaler and threshold to a directory."""
+        os.makedirs(path, exist_ok=True)
+        joblib.dump(self, os.path.join(path, 'detector.joblib'))
+
+    @classmethod
+    def load_model(cls, path, sequence_length=None, n_features=None):
+        """Load a detector saved with ``save_model``."""
+        return joblib.load(os.path.join(path, 'detector.joblib'))
+
+class ZScoreDetector(AnomalyDetector):
+    """Robust per-feature z-scores smoothed with an EWMA over each window.
+
+    Features are centred on their median and scaled by the MAD, so a few
+    extreme rows in the training data do not hide themselves. Within a
+    window the squared z-scores are weighted towards the newest row.
+    """
+
+    name = 'zscore'
+
+    def __init__(self, sequence_length, n_features, alpha=0.3):
+        super().__init__(sequence_length, n_features)
+        self.alpha = alpha
+        self.center = np.zeros(n_features, dtype=np.float32)
+        self.spread = np.ones(n_features, dtype=np.float32)
+        weights = alpha * (1 - alpha) ** np.arange(sequence_length - 1, -1, -1)
+        self.weights = (weights / weights.sum()).astype(np.float32)
+
+    def fit(self, sequences):
+        rows = _window_rows(sequences)
+        self.center = np.median(rows, axis=0).astype(np.float32)
+        mad = np.median(np.abs(rows - self.center), axis=0) * 1.4826
+        # Constant or near-constant features fall back to the standard deviation
+        std = rows.std(axis=0)
+        spread = np.where(mad > 1e-6, mad, std)
+        self.spread = np.where(spread > 1e-6, spread, 1.0).astype(np.float32)
+
+    def partial_fit(self, sequences, epochs=None, batch_size=None, rate=0.3):
+        """Blend the centre and spread of new windows into the current ones."""
+        center, spread = self.center, self.spread
+        self.fit(_as_windows(sequences))
+        self.center = ((1 - rate) * center + rate * self.center).astype(np.float32)
+        self.spread = ((1 - rate) * spread + rate * self.spread).astype(np.float32)
+
+    def _reconstruction_errors(self, batch):
+        z = (batch - self.center) / self.spread
+        return np.einsum('l,blf->bf', self.weights, np.square(z))
+
+class IsolationForestDetector(AnomalyDetector):
+    """IsolationForest over per-window feature means and standard deviations.
+
+    The forest yields one anomaly score per window; it is split across
+    features in proportion to each feature's squared deviation from its
+    training mean, so per-feature errors still average to the window score.
+    """
+
+    name = 'isolation_forest'
+
+    def __init__(self, sequence_length, n_features, n_estimators=100, random_state=0):
+        from sklearn.ensemble import IsolationForest
+        super().__init__(sequence_length, n_features)
+        self.forest = IsolationForest(n_estimators=n_estimators, random_state=random_state)
+        self.mean = np.zeros(n_features, dtype=np.float32)
+        self.std = np.ones(n_features, dtype=np.float32)
+
+    @staticmethod
+    def _summarize(batch):
+        return np.concatenate([batch.mean(axis=1), batch.std(axis=1)], axis=1)
+
+    def fit(self, sequences):
+        summary = self._summarize(_fit_sample(sequences))
+        means = summary[:, :self.n_features]
+        self.mean = means.mean(axis=0)
+        std = means.std(axis=0)
+        self.std = np.where(std > 1e-6, std, 1.0).astype(np.float32)
+        self.forest.fit(summary)
+
+    def _reconstruction_errors(self, batch):
+        summary = self._summarize(batch)
+        window_scores = -self.forest.score_samples(summary)
+        deviation = np.square((summary[:, :self.n_features] - self.mean) / self.std) + 1e-6
+        share = deviation / deviation.sum(axis=1, keepdims=True)
+        return (window_scores * self.n_features)[:, None] * share
+
+class PCADetector(AnomalyDetector):
+    """Principal-component model of flattened windows.
+
+    NumPy only: the covariance of a sample of windows is eigendecomposed and
+    enough components are kept to explain ``explained_variance`` of it. The
+    error combines the residual outside that subspace (normalized by the
+    residual variance) with the whitened distance inside it (Hotelling's
+    T²), so anomalies that move features along a principal direction are
+    caught as well.
+    """
+
+    name = 'pca'
+
+    def __init__(self, sequence_length, n_features, explained_variance=0.95):
+        super().__init__(sequence_length, n_features)
+        self.explained_variance = explained_variance
+        self.mean = None
+        self.components = None
+        self.scales = None
+        self.residual_variance = 1.0
+
+    def fit(self, sequences):
+        sample = _fit_sample(sequences).reshape(-1, self.sequence_length * self.n_features)
+        self.mean = sample.mean(axis=0)
+        centered = sample - self.mean
+        covariance = centered.T @ centered / max(len(sample) - 1, 1)
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        # eigh returns ascending eigenvalues
+        eigenvalues = np.clip(eigenvalues[::-1], 0, None)
+        eigenvectors = eigenvectors[:, ::-1]
+        total = eigenvalues.sum()
+        if total > 0:
+            ratio = np.cumsum(eigenvalues) / total
+            n_components = int(np.searchsorted(ratio, self.explained_variance) + 1)
+        else:
+            n_components = 1
+        self.components = eigenvectors[:, :n_components].T.astype(np.float32)
+        self.scales = np.sqrt(np.maximum(eigenvalues[:n_components], 1e-6)).astype(np.float32)
+        discarded = eigenvalues[n_components:]
+        self.residual_variance = float(max(discarded.mean() if len(discarded) else 0.0, 1e-6))
+
+    def _reconstruction_errors(self, batch):
+        centered = batch.reshape(len(batch), -1) - self.mean
+        projected = centered @ self.components.T
+        residual = centered - projected @ self.components
+        # Rows of ``components`` are orthonormal, so this spreads T² over the inputs
+        whitened = (projected / self.scales) @ self.components
+        errors = np.square(residual) / self.residual_variance + np.square(whitened)
+        return np.mean(errors.reshape(batch.shape), axis=1)
+
+def _lstm_detector():
+    # Imported lazily so the lightweight engines do not pull in TensorFlow
+    from models.lstm_autoencoder import LogAnalysisModel
+    return LogAnalysisModel
+
+DETECTORS = {
+    'lstm': _lstm_detector,
+    'zscore': lambda: ZScoreDetector,
+    'isolation_forest': lambda: IsolationForestDetector,
+    'pca': lambda: PCADetector,
+}
+
+def choose_detector(n_rows, n_features, sequence_length=SEQUENCE_LENGTH):
+    """Pick a detector engine for a dataset by its size.
+
+    Small inputs and low-dimensional metric streams use robust z-scores;
+    moderate window sizes use PCA, which also catches broken correlations
+    between features, and very wide ones IsolationForest. The LSTM
+    autoencoder, the default engine, is not chosen by ``auto``.
+    """
+    if n_rows < DETECTOR_SMALL_ROWS or n_features <= DETECTOR_ZSCORE_MAX_FEATURES:
+        return 'zscore'
+    if sequence_length * n_features <= DETECTOR_PCA_MAX_DIMS:
+        return 'pca'
+    return 'isolation_forest'
+
+def resolve_detector_name(name, n_rows, n_features, sequence_length=SEQUENCE_LENGTH):
+    """Validate a requested engine name, resolving ``auto`` by data size."""
+    name = (name or DEFAULT_DETECTOR).lower()
+    if name == 'auto':
+        return choose_detector(n_rows, n_features, sequence_length)
+    if name not in DETECTORS:
+        raise ValueError(
+            f"Unknown detector '{name}'. Use one of: auto, {', '.join(DETECTORS)}"
+        )
+    return name
+
+def create_detector(name, sequence_length, n_features):
+    """Instantiate an untrained detector by engine name."""
+    return DETECTORS[name]()(sequence_length, n_features)
+
+def load_detector(path, sequence_length, n_features):
+    """Load any saved detector from a directory written by its ``save_model``."""
+    if os.path.exists(os.path.join(path, 'detector.joblib')):
+        return AnomalyDetector.load_model(path)
+    return _lstm_detector().load_model(path, sequence_length, n_features)
+
+def sliding_windows(features, sequence_length):
+    """Return overlapping windows of ``features`` as a zero-copy strided view.
+
+    The result has shape ``(n_rows - sequence_length + 1, sequence_length,
+    n_features)`` but shares memory with a single float32 copy of the input.
+    """
+    features = np.ascontiguousarray(features, dtype=np.float32)
+    windows = np.lib.stride_tricks.sliding_window_view(features, sequence_length, axis=0)
+    return windows.transpose(0, 2, 1)
+
+def _window_rows(sequences):
+    """Recover the underlying rows from overlapping windows."""
+    return np.concatenate([sequences[0], sequences[1:, -1]]) if len(sequences) else sequences.reshape(0, -1)
+
+def _fit_sample(sequences, max_windows=DETECTOR_MAX_FIT_WINDOWS):
+    """Copy an evenly spaced sample of at most ``max_windows`` windows."""
+    if len(sequences) <= max_windows:
+        return np.ascontiguousarray(sequences)
+    index = np.linspace(0, len(sequences) - 1, max_windows).astype(np.int64)
+    return np.ascontiguousarray(sequences[index])
+
+def _sigmoid(values):
+    return (1.0 / (1.0 + np.exp(-values))).astype(np.float32)
+
+def _as_windows(sequences):
+    if not isinstance(sequences, np.ndarray) and hasattr(sequences, 'numpy'):
+        sequences = sequences.numpy()
+    if isinstance(sequences, np.ndarray) and sequences.dtype == np.float32:
+        return sequences
+    return np.asarray(sequences, dtype=np.float32)
@@ -1,14 +1,18 @@
+import os
+import joblib
 import tensorflow as tf
 import numpy as np
-from sklearn.preprocessing import StandardScaler
+from models.detectors import AnomalyDetector, _as_windows
 
-class LogAnalysisModel:
-    def __init__(self, sequence_length, n_features):
-        self.sequence_length = sequence_length
-        self.n_features = n_features
-        self.model = self._build_model()
-        self.threshold = 0.7
-        self.scaler = StandardScaler()
+class LogAnalysisModel(AnomalyDetector):
+    """Two-layer LSTM encoder/decoder scored by window reconstruction error."""
+
+    name = 'lstm'
+
+    def __init__(self, sequence_length, n_features, model=None):
+        super().__init__(sequence_length, n_features)
+        self.model = model if model is not None else self._build_model()
+        self._predict_fn = None
         
     def _build_model(self):
         # Encoder
@@ -27,57 +31,116 @@ class LogAnalysisModel:
         
         return tf.keras.Model(inputs, outputs)
     
-    def train(self, sequences, epochs=10, batch_size=32):
-        """Train the model on the input sequences."""
-        self.model.compile(optimizer='adam', loss='mse')
+    def train(self, sequences, epochs=10, batch_size=32, calibrate=True):
+        """Train the model on the input sequences.
+
+        ``sequences`` may be a strided window view (see ``sliding_windows``);
+        batches are gathered from it on the fly so the full window tensor is
+        never materialized. With ``calibrate=False`` the threshold is left
+        untouched so the caller can set it from its own scoring pass via
+        ``score(update_threshold=True)``.
+        """
+        sequences = _as_windows(sequences)
+        
+        # Hold out the last 10% of windows for validation
+        n_windows = len(sequences)
+        n_val = int(n_windows * 0.1)
+        train_index = np.arange(n_windows - n_val)
+        val_index = np.arange(n_windows - n_val, n_windows)
+        
+        # Recompiling would reset the optimizer state and retrace the train step
+        if getattr(self.model, 'optimizer', None) is None:
+            self.model.compile(optimizer='adam', loss='mse')
         history = self.model.fit(
-            sequences, sequences,
+            self._window_dataset(sequences, train_index, batch_size, shuffle=True),
             epochs=epochs,
-            batch_size=batch_size,
-            validation_split=0.1,
+            shuffle=False,  # Batches are already shuffled by the dataset
+            validation_data=(
+                self._window_dataset(sequences, val_index, batch_size) if n_val else None
+            ),
             verbose=0
         )
         
         # Calculate reconstruction error threshold
-        reconstructions = self.model.predict(sequences)
-        mse = np.mean(np.power(sequences - reconstructions, 2), axis=(1, 2))
-        self.threshold = np.percentile(mse, 95)  # Set threshold at 95th percentile
+        if calibrate:
+            self.score(sequences, update_threshold=True)
         
         return history
     
+    def partial_fit(self, sequences, epochs=1, batch_size=32):
+        """Fine-tune from the current weights instead of starting from scratch."""
+        return self.train(sequences, epochs=epochs, batch_size=batch_size, calibrate=False)
+    
+    def _window_dataset(self, sequences, index, batch_size, shuffle=False):
+        """Stream ``(x, x)`` batches of windows selected by ``index``."""
+        def batches():
+            order = np.random.permutation(index) if shuffle else index
+            for start in range(0, len(order), batch_size):
+                batch = np.ascontiguousarray(sequences[order[start:start + batch_size]])
+                yield batch, batch
+        
+        spec = tf.TensorSpec(shape=(None, self.sequence_length, self.n_features), dtype=tf.float32)
+        n_batches = -(-len(index) // batch_size)
+        dataset = tf.data.Dataset.from_generator(batches, output_signature=(spec, spec))
+        dataset = dataset.apply(tf.data.experimental.assert_cardinality(n_batches))
+        return dataset.prefetch(tf.data.AUTOTUNE)
+    
+    def _compiled_predict(self):
+        """Forward pass traced once with a fixed input signature.
+
+        Only the batch dimension varies, so batches of any size reuse the
+        same graph instead of paying ``predict``'s per-call setup.
+        """
+        if self._predict_fn is None:
+            spec = tf.TensorSpec(shape=(None, self.sequence_length, self.n_features), dtype=tf.float32)
+            self._predict_fn = tf.function(
+                lambda batch: self.model(batch, training=False), input_signature=[spec]
+            )
+        return self._predict_fn
+    
+    def _reconstruction_errors(self, batch):
+        reconstructions = self._compiled_predict()(batch).numpy()
+        return np.mean(np.square(batch - reconstructions), axis=1)
+    
     def get_anomaly_score(self, sequences):
         """Calculate anomaly scores for input sequences."""
-        reconstructions = self.model.predict(sequences)
-        mse = np.mean(np.power(sequences - reconstructions, 2), axis=(1, 2))
-        scores = tf.nn.sigmoid(tf.convert_to_tensor(mse))  # Normalize scores between 0 and 1
-        return scores
+        return tf.convert_to_tensor(self.score(sequences)['scores'])
     
     def detect_anomalies(self, sequences):
         """Detect anomalies in the input sequences."""
-        reconstructions = self.model.predict(sequences)
-        mse = np.mean(np.power(sequences - reconstructions, 2), axis=(1, 2))
-        return tf.cast(mse > self.threshold, tf.float32)
+        return tf.convert_to_tensor(self.score(sequences)['anomalies'])
     
     def get_confidence_scores(self, sequences):
         """Calculate confidence scores for anomaly predictions."""
-        reconstructions = self.model.predict(sequences)
-        mse = np.mean(np.power(sequences - reconstructions, 2), axis=(1, 2))
-        
-        # Calculate distance from threshold
-        distances = np.abs(mse - self.threshold)
-        max_distance = max(np.max(distances), 1e-10)  # Avoid division by zero
-        
-        # Normalize distances to get confidence scores
-        confidence = distances / max_distance
-        return tf.nn.sigmoid(tf.convert_to_tensor(confidence))
+        return tf.convert_to_tensor(self.score(sequences)['confidence'])
     
     def save_model(self, path):
-        """Save the model to disk."""
-        self.model.save(path)
+        """Save the model, its fitted scaler and threshold to a directory."""
+        os.makedirs(path, exist_ok=True)
+        self.model.save(os.path.join(path, 'model.keras'))
+        joblib.dump(
+            {
+                'detector': self.name,
+                'threshold': float(self.threshold),
+                'scaler': self.scaler,
+                'threshold_estimator': self.threshold_estimator,
+                'baseline_error': self.baseline_error,
+                'updates_since_full_fit': self.updates_since_full_fit
+            },
+            os.path.join(path, 'state.joblib')
+        )
     
     @classmethod
     def load_model(cls, path, sequence_length, n_features):
         """Load a saved model from disk."""
-        instance = cls(sequence_length, n_features)
-        instance.model = tf.keras.models.load_model(path)
+        model = tf.keras.models.load_model(os.path.join(path, 'model.keras'))
+        instance = cls(sequence_length, n_features, model=model)
+        state_path = os.path.join(path, 'state.joblib')
+        if os.path.exists(state_path):
+            state = joblib.load(state_path)
+            instance.threshold = state['threshold']
+            instance.scaler = state['scaler']
+            instance.threshold_estimator = state.get('threshold_estimator')
+            instance.baseline_error = state.get('baseline_error')
+            instance.updates_since_full_fit = state.get('updates_since_full_fit', 0)
         return instance
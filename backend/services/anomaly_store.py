@@ -0,0 +1,261 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from services.storage import UPLOAD_DIR
+
+ANOMALY_DB_PATH = os.getenv('ANOMALY_DB_PATH', os.path.join(UPLOAD_DIR, 'anomalies.db'))
+ANOMALY_STORE_ENABLED = os.getenv('ANOMALY_STORE', 'true').lower() in ('1', 'true', 'yes')
+# Rows returned per page when the caller does not ask for a limit, and the most allowed
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id TEXT PRIMARY KEY,
+    source TEXT,
+    content_hash TEXT,
+    detector TEXT,
+    total_logs INTEGER,
+    total_anomalies INTEGER,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS anomalies (
+    id INTEGER PRIMARY KEY,
+    analysis_id TEXT NOT NULL REFERENCES analyses(id) ON DELETE CASCADE,
+    source TEXT NOT NULL,
+    file TEXT,
+    row_index INTEGER,
+    event_time TEXT,
+    ts REAL NOT NULL,
+    severity TEXT,
+    score REAL,
+    confidence REAL,
+    top_feature TEXT,
+    context TEXT,
+    feature_errors TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_anomalies_ts ON anomalies (ts);
+CREATE INDEX IF NOT EXISTS idx_anomalies_source_ts ON anomalies (source, ts, severity, score, analysis_id);
+CREATE INDEX IF NOT EXISTS idx_anomalies_severity_ts ON anomalies (severity, ts);
+CREATE INDEX IF NOT EXISTS idx_anomalies_score ON anomalies (score);
+CREATE INDEX IF NOT EXISTS idx_anomalies_source_score ON anomalies (source, score);
+CREATE INDEX IF NOT EXISTS idx_anomalies_analysis ON anomalies (analysis_id);
+"""
+
+# Sort key column and direction of each listing order
+ORDERS = {
+    'time': ('ts', 'ASC'),
+    'time_desc': ('ts', 'DESC'),
+    'score': ('score', 'DESC')
+}
+
+def to_epoch(value):
+    """Unix seconds for an ISO-8601 string (naive means UTC) or a number, None for None."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    # fromisoformat only accepts a trailing 'Z' from Python 3.11 on
+    if value.endswith(('Z', 'z')):
+        value = value[:-1] + '+00:00'
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def analysis_key(content_hash, options=None):
+    """Identify the analysis of some content with some options."""
+    options_key = hashlib.sha256(
+        json.dumps(options or {}, sort_keys=True, default=str).encode('utf-8')
+    ).hexdigest()[:16]
+    return f"{content_hash}-{options_key}"
+
+def encode_cursor(key, row_id):
+    return f"{key!r}:{row_id}"
+
+def decode_cursor(cursor):
+    try:
+        key, row_id = cursor.rsplit(':', 1)
+        return float(key), int(row_id)
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid cursor '{cursor}'")
+
+class AnomalyStore:
+    """Detected anomalies persisted in SQLite for later querying.
+
+    Every analysis is stored once with its anomalies. Rows are indexed on
+    source, event time, severity and score, so time ranges, top-N and
+    per-source aggregates over weeks of history are answered from indexes.
+    Pages are keyset-paginated: the cursor is the last row's sort key and
+    id, so deep pages cost the same as the first one. Anomalies without an
+    event time are filed under the time they were stored (``event_time``
+    stays null).
+    """
+
+    def __init__(self, path=ANOMALY_DB_PATH, enabled=ANOMALY_STORE_ENABLED):
+        self.path = path
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                    with sqlite3.connect(self.path) as conn:
+                        # WAL lets queries run while an analysis is being written
+                        conn.execute('PRAGMA journal_mode=WAL')
+                        conn.executescript(SCHEMA)
+                    self._initialized = True
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA foreign_keys=ON')
+        # With WAL this only risks the last commits on power loss, never corruption
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def save(self, analysis_id, results, source=None, file=None, content_hash=None):
+        """Store an analysis and its anomalies, replacing an earlier copy of it.
+
+        ``source`` names the log producer; without one the file name is used.
+        Batch anomalies keep their own ``file``. Returns the rows written.
+        """
+        if not self.enabled:
+            return 0
+        now = time.time()
+        rows = []
+        for anomaly in results.get('anomalies', []):
+            event_ts = to_epoch(anomaly.get('event_time'))
+            anomaly_file = anomaly.get('file', file)
+            rows.append((
+                analysis_id, str(source or anomaly_file or 'unknown'), anomaly_file,
+                anomaly.get('index'), anomaly.get('event_time'), event_ts if event_ts is not None else now,
+                anomaly.get('severity'), anomaly.get('anomaly_score'), anomaly.get('confidence'),
+                anomaly.get('top_feature'), json.dumps(anomaly.get('context', {}), default=str),
+                json.dumps(anomaly.get('feature_errors', {}), default=str)
+            ))
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('DELETE FROM analyses WHERE id = ?', (analysis_id,))
+                conn.execute(
+                    'INSERT INTO analyses (id, source, content_hash, detector, total_logs, total_anomalies, created_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (analysis_id, source, content_hash, results.get('detector'),
+                     results.get('total_logs'), len(rows), now)
+                )
+                conn.executemany(
+                    'INSERT INTO anomalies (analysis_id, source, file, row_index, event_time, ts, severity, '
+                    'score, confidence, top_feature, context, feature_errors) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    rows
+                )
+        finally:
+            conn.close()
+        return len(rows)
+
+    def query(self, start=None, end=None, source=None, severity=None, min_score=None,
+              order='time', limit=DEFAULT_PAGE_SIZE, cursor=None):
+        """Return one page of anomalies as ``{'anomalies', 'next_cursor'}``.
+
+        ``start``/``end`` bound the event time (inclusive, ISO-8601 or unix
+        seconds); ``order`` is ``time``, ``time_desc`` or ``score`` (top-N by
+        score, highest first). Pass ``next_cursor`` back to get the next page;
+        it is None on the last page.
+        """
+        if order not in ORDERS:
+            raise ValueError(f"Unknown order '{order}'. Use one of: {', '.join(ORDERS)}")
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        key, direction = ORDERS[order]
+        where, params = self._filters(start, end, source, severity, min_score)
+        if cursor is not None:
+            # Row-value comparison continues right after the last row of the previous page
+            where.append(f"({key}, id) {'>' if direction == 'ASC' else '<'} (?, ?)")
+            params.extend(decode_cursor(cursor))
+        sql = (
+            'SELECT * FROM anomalies'
+            + (f" WHERE {' AND '.join(where)}" if where else '')
+            + f" ORDER BY {key} {direction}, id {direction} LIMIT ?"
+        )
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, params + [limit + 1]).fetchall()
+        finally:
+            conn.close()
+        page = rows[:limit]
+        next_cursor = encode_cursor(page[-1][key], page[-1]['id']) if len(rows) > limit else None
+        return {'anomalies': [self._anomaly(row) for row in page], 'next_cursor': next_cursor}
+
+    def summary(self, start=None, end=None, source=None, severity=None, min_score=None):
+        """Aggregate anomalies per source: counts, severity split, scores and time span."""
+        where, params = self._filters(start, end, source, severity, min_score)
+        sql = (
+            "SELECT source, COUNT(*) AS anomalies, SUM(severity = 'High') AS high, "
+            "SUM(severity = 'Medium') AS medium, MAX(score) AS max_score, AVG(score) AS mean_score, "
+            "MIN(ts) AS first_seen, MAX(ts) AS last_seen, COUNT(DISTINCT analysis_id) AS analyses "
+            'FROM anomalies'
+            + (f" WHERE {' AND '.join(where)}" if where else '')
+            + ' GROUP BY source ORDER BY anomalies DESC'
+        )
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+        sources = []
+        for row in rows:
+            entry = dict(row)
+            entry['first_seen'] = self._iso(entry['first_seen'])
+            entry['last_seen'] = self._iso(entry['last_seen'])
+            sources.append(entry)
+        return {'sources': sources, 'total_anomalies': sum(entry['anomalies'] for entry in sources)}
+
+    def _filters(self, start, end, source, severity, min_score):
+        where, params = [], []
+        if source is not None:
+            where.append('source = ?')
+            params.append(source)
+        if severity is not None:
+            where.append('severity = ?')
+            params.append(severity)
+        if start is not None:
+            where.append('ts >= ?')
+            params.append(to_epoch(start))
+        if end is not None:
+            where.append('ts <= ?')
+            params.append(to_epoch(end))
+        if min_score is not None:
+            where.append('score >= ?')
+            params.append(float(min_score))
+        return where, params
+
+    def _anomaly(self, row):
+        return {
+            'id': row['id'],
+            'analysis_id': row['analysis_id'],
+            'source': row['source'],
+            'file': row['file'],
+            'index': row['row_index'],
+            'event_time': row['event_time'],
+            'timestamp': row['event_time'] or self._iso(row['ts']),
+            'anomaly_score': row['score'],
+            'confidence': row['confidence'],
+            'severity': row['severity'],
+            'top_feature': row['top_feature'],
+            'context': json.loads(row['context'] or '{}'),
+            'feature_errors': json.loads(row['feature_errors'] or '{}')
+        }
+
+    def _iso(self, seconds):
+        if seconds is None:
+            return None
+        return datetime.fromtimestamp(seconds, tz=timezone.utc).isoformat().replace('+00:00', 'Z')
+
+anomaly_store = AnomalyStore()
@@ -0,0 +1,323 @@
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from services.metrics import StageTimings
+
+# Worker processes used by the command line entry point
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', os.cpu_count() or 1))
+# Files with these extensions are opened as archives when their content is one
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tgz', '.gz', '.bz2', '.xz')
+
+@contextmanager
+def expand_targets(targets, tmp_root=None):
+    """Resolve files, directories, glob patterns and archives to ``(name, path)`` pairs.
+
+    ``targets`` holds paths or ``(name, path)`` pairs; names label the files
+    in the report. Directories are walked recursively (hidden entries are
+    skipped) and archives are extracted into a temporary directory that is
+    removed when the context exits.
+    """
+    if tmp_root is not None:
+        os.makedirs(tmp_root, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix='batch-', dir=tmp_root)
+    try:
+        files = []
+        for target in targets:
+            name, path = (target, target) if isinstance(target, str) else target
+            _expand(name, path, tmp_dir, files)
+        yield files
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def _expand(name, path, tmp_dir, files):
+    if os.path.isdir(path):
+        for root, dirs, filenames in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for filename in sorted(filenames):
+                if filename.startswith('.'):
+                    continue
+                file_path = os.path.join(root, filename)
+                _expand(os.path.join(name, os.path.relpath(file_path, path)), file_path, tmp_dir, files)
+    elif os.path.isfile(path):
+        if is_archive(path):
+            dest = tempfile.mkdtemp(dir=tmp_dir)
+            extract_archive(path, dest)
+            _expand(name, dest, tmp_dir, files)
+        else:
+            files.append((name, path))
+    else:
+        matches = sorted(glob.glob(path, recursive=True))
+        if not matches:
+            raise FileNotFoundError(f"No log files match {name}")
+        for match in matches:
+            _expand(match, match, tmp_dir, files)
+
+def is_archive(path):
+    if not path.lower().endswith(ARCHIVE_EXTENSIONS):
+        return False
+    return zipfile.is_zipfile(path) or tarfile.is_tarfile(path)
+
+def extract_archive(path, dest):
+    """Extract the regular files of a zip or tar archive into ``dest``.
+
+    Members that would land outside ``dest`` (absolute paths, ``..``) and
+    links or devices are skipped.
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for member in archive.infolist():
+                target = _member_path(dest, member.filename)
+                if member.is_dir() or target is None:
+                    continue
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with archive.open(member) as src, open(target, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+        return
+
+    with tarfile.open(path) as archive:
+        for member in archive:
+            target = _member_path(dest, member.name)
+            if not member.isfile() or target is None:
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with archive.extractfile(member) as src, open(target, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+
+def _member_path(dest, name):
+    root = os.path.realpath(dest)
+    target = os.path.realpath(os.path.join(root, name))
+    if target == root or os.path.commonpath([root, target]) != root:
+        return None
+    return target
+
+def layout_key(columns, column_types):
+    """Identify a column layout; files sharing one share a schema and model."""
+    layout = {
+        'columns': [str(column) for column in columns],
+        'column_types': {str(column): column_types[column] for column in columns}
+    }
+    return hashlib.sha256(json.dumps(layout, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+def probe_layout(path):
+    """Infer the layout of a log file from its first rows. Runs in a worker."""
+    from services.ingest import iter_log_chunks
+    from services.schema import SCHEMA_SAMPLE_ROWS, infer_column_types
+
+    try:
+        chunk = next(iter_log_chunks(path, SCHEMA_SAMPLE_ROWS), None)
+        if chunk is None or chunk.empty:
+            return {'error': "Log file is empty"}
+        column_types = infer_column_types(chunk)
+    except Exception as e:
+        return {'error': str(e)}
+    return {
+        'layout': layout_key(chunk.columns, column_types),
+        'columns': list(chunk.columns),
+        'column_types': column_types
+    }
+
+def analyze_batch_file(name, path, column_types=None, detector=None):
+    """Analyze one file of a batch with a shared schema. Runs in a worker.
+
+    Returns the file's breakdown with its anomalies tagged by file name,
+    plus its mergeable column statistics; failures are returned
+    as ``error`` so one bad file does not sink the batch.
+    """
+    from services.log_analyzer import analyze_logs
+
+    try:
+        results = analyze_logs(path, detector=detector, column_types=column_types, keep_stats_sketch=True)
+    except Exception as e:
+        return {'file': name, 'error': str(e)}
+
+    anomalies = results['anomalies']
+    for anomaly in anomalies:
+        anomaly['file'] = name
+    metrics = results.get('metrics', {})
+    return {
+        'file': name,
+        'total_logs': results['total_logs'],
+        'total_anomalies': results['total_anomalies'],
+        'detector': results['detector'],
+        'model_reused': metrics.get('model_reused'),
+        'training': metrics.get('training'),
+        'anomalies': anomalies,
+        'metrics': metrics,
+        'column_stats_sketch': results['column_stats_sketch']
+    }
+
+def merge_batch_results(file_results, layouts):
+    """Merge per-file results into one report with anomalies in event-time order.
+
+    Anomalies without an event time follow the timed ones, in file and row order.
+    """
+    import numpy as np
+    import pandas as pd
+
+    anomalies, file_order = [], []
+    for position, result in enumerate(file_results):
+        anomalies.extend(result.get('anomalies', []))
+        file_order.extend([position] * len(result.get('anomalies', [])))
+
+    if anomalies:
+        times = pd.to_datetime(
+            pd.Series([anomaly['event_time'] for anomaly in anomalies], dtype=object),
+            errors='coerce', utc=True
+        )
+        missing = times.isna().to_numpy()
+        nanos = times.dt.tz_convert(None).to_numpy(dtype='datetime64[ns]').view(np.int64)
+        nanos = np.where(missing, 0, nanos)
+        rows = np.array([anomaly['index'] for anomaly in anomalies], dtype=np.int64)
+        order = np.lexsort((rows, np.asarray(file_order), nanos, missing))
+        anomalies = [anomalies[i] for i in order]
+
+    files = [
+        {key: value for key, value in result.items()
+         if key not in ('anomalies', 'metrics', 'column_stats_sketch')}
+        for result in file_results
+    ]
+    return {
+        'total_files': len(files),
+        'failed_files': sum(1 for result in files if 'error' in result),
+        'total_logs': sum(result.get('total_logs', 0) for result in files),
+        'total_anomalies': len(anomalies),
+        'layouts': layouts,
+        'files': files,
+        'anomalies': anomalies
+    }
+
+def _run_all(submit, fn, calls, max_in_flight=None):
+    """Run ``fn(*args)`` for every tuple in ``calls`` and return results in call order.
+
+    At most ``max_in_flight`` calls are submitted at once so a batch never
+    fills a shared queue on its own.
+    """
+    results = [None] * len(calls)
+    limit = max_in_flight or len(calls)
+    pending = {}
+    next_call = 0
+    while next_call < len(calls) or pending:
+        while next_call < len(calls) and len(pending) < limit:
+            pending[submit(fn, *calls[next_call])] = next_call
+            next_call += 1
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            results[pending.pop(future)] = future.result()
+    return results
+
+def analyze_batch(targets, submit, detector=None, max_in_flight=None, tmp_root=None):
+    """Analyze many log files in parallel and merge them into one report.
+
+    ``submit(fn, *args)`` schedules work on a process pool and returns a
+    Future. Files are first probed for their column layout; the largest
+    file of each layout is analyzed first so it trains (or loads) the model
+    for that layout, then every other file is scored against that model in
+    parallel with the schema and detector engine it resolved.
+    """
+    timings = StageTimings()
+    with expand_targets(targets, tmp_root) as files:
+        if not files:
+            raise ValueError("No log files found")
+
+        with timings.stage('probe'):
+            probes = _run_all(submit, probe_layout, [(path,) for _, path in files], max_in_flight)
+        file_results = [None] * len(files)
+        groups = OrderedDict()
+        for i, probe in enumerate(probes):
+            if 'error' in probe:
+                file_results[i] = {'file': files[i][0], 'error': probe['error']}
+            else:
+                groups.setdefault(probe['layout'], []).append(i)
+
+        seeds = OrderedDict(
+            (layout, max(indexes, key=lambda i: os.path.getsize(files[i][1])))
+            for layout, indexes in groups.items()
+        )
+        with timings.stage('seed'):
+            seed_results = _run_all(submit, analyze_batch_file, [
+                (files[i][0], files[i][1], probes[i]['column_types'], detector) for i in seeds.values()
+            ], max_in_flight)
+        for i, result in zip(seeds.values(), seed_results):
+            file_results[i] = result
+
+        # Reuse the seed's engine so ``auto`` cannot pick a different model per file
+        rest, calls = [], []
+        for layout, indexes in groups.items():
+            engine = file_results[seeds[layout]].get('detector', detector)
+            for i in indexes:
+                if i != seeds[layout]:
+                    rest.append(i)
+                    calls.append((files[i][0], files[i][1], probes[i]['column_types'], engine))
+        with timings.stage('analyze'):
+            for i, result in zip(rest, _run_all(submit, analyze_batch_file, calls, max_in_flight)):
+                file_results[i] = result
+
+    layouts = []
+    for layout, indexes in groups.items():
+        # Column statistics of every file in the layout, merged from the workers' sketches
+        stats = None
+        for i in indexes:
+            file_results[i]['layout'] = layout
+            sketch = file_results[i].get('column_stats_sketch')
+            if sketch is not None:
+                stats = sketch if stats is None else stats.merge(sketch)
+        layouts.append({
+            'layout': layout,
+            'columns': [str(column) for column in probes[indexes[0]]['columns']],
+            'files': len(indexes),
+            'seed_file': files[seeds[layout]][0],
+            'detector': file_results[seeds[layout]].get('detector'),
+            'column_stats': stats.result() if stats is not None else {}
+        })
+
+    with timings.stage('merge'):
+        report = merge_batch_results(file_results, layouts)
+    timings.count('files', len(files))
+    report['metrics'] = timings.as_dict()
+    report['metrics']['file_metrics'] = [result['metrics'] for result in file_results if 'metrics' in result]
+    return report
+
+def main(argv=None):
+    from models.detectors import DETECTORS
+
+    parser = argparse.ArgumentParser(
+        description="Analyze log files in parallel and merge their anomalies into one time-ordered report"
+    )
+    parser.add_argument('targets', nargs='+',
+                        help="log files, directories, glob patterns or zip/tar archives")
+    parser.add_argument('--workers', type=int, default=BATCH_WORKERS)
+    parser.add_argument('--detector', help=f"anomaly detection engine: auto, {', '.join(DETECTORS)}")
+    parser.add_argument('--out', help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+    if args.detector and args.detector != 'auto' and args.detector not in DETECTORS:
+        parser.error(f"unknown detector: {args.detector}")
+
+    # Spawn rather than fork: TensorFlow is not fork-safe once initialized
+    with ProcessPoolExecutor(max_workers=args.workers,
+                             mp_context=multiprocessing.get_context('spawn')) as executor:
+        report = analyze_batch(args.targets, executor.submit, detector=args.detector)
+
+    print(f"Analyzed {report['total_files']} files ({report['failed_files']} failed), "
+          f"{report['total_logs']} rows, {report['total_anomalies']} anomalies "
+          f"in {report['metrics']['total_seconds']:.1f}s", file=sys.stderr)
+    output = json.dumps(report, indent=2, default=str)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+    return 1 if report['failed_files'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
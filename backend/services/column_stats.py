@@ -0,0 +1,241 @@
+import os
+import numpy as np
+import pandas as pd
+from services.ingest import CHUNK_ROWS
+
+# Distinct values tracked per categorical column by the space-saving sketch
+STATS_TOP_K_CAPACITY = int(os.getenv('STATS_TOP_K_CAPACITY', 1024))
+# HyperLogLog uses 2**precision one-byte registers (~0.8% error at 14)
+HLL_PRECISION = 14
+# Most frequent values reported per categorical column
+TOP_VALUES = 5
+
+class NumericMoments:
+    """Count, mean, variance, min and max of a numeric column in one pass.
+
+    Each chunk is reduced to its own moments with vectorized numpy calls and
+    folded in with Chan et al.'s parallel form of Welford's update, so the
+    result is exact, numerically stable and mergeable in any order.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        chunk = NumericMoments()
+        chunk.count = len(values)
+        chunk.mean = float(values.mean())
+        chunk.m2 = float(np.square(values - chunk.mean).sum())
+        chunk.min = float(values.min())
+        chunk.max = float(values.max())
+        return self.merge(chunk)
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def result(self):
+        count = self.count
+        return {
+            'type': 'numeric',
+            'mean': float(self.mean) if count else float('nan'),
+            'std': float(np.sqrt(self.m2 / (count - 1))) if count > 1 else float('nan'),
+            'min': float(self.min) if count else float('nan'),
+            'max': float(self.max) if count else float('nan')
+        }
+
+class SpaceSaving:
+    """Approximate top-k counts in at most ``capacity`` counters.
+
+    Counts are exact while fewer than ``capacity`` distinct values have been
+    seen; after that they are upper bounds that overestimate by at most the
+    smallest tracked count. Merging follows the mergeable summaries scheme:
+    a value missing from a full summary is charged that summary's minimum.
+    """
+
+    def __init__(self, capacity=STATS_TOP_K_CAPACITY):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype='int64')
+        self.saturated = False
+
+    def update(self, values):
+        return self.add_counts(pd.Series(values).value_counts())
+
+    def add_counts(self, counts):
+        """Fold in exact counts of a chunk, e.g. from ``value_counts``."""
+        chunk = SpaceSaving(self.capacity)
+        chunk.counts = counts
+        chunk._truncate()
+        return self.merge(chunk)
+
+    def merge(self, other):
+        if len(other.counts) == 0:
+            return self
+        if len(self.counts) == 0:
+            self.counts, self.saturated = other.counts, other.saturated
+            return self
+        index = self.counts.index.union(other.counts.index, sort=False)
+        self.counts = (
+            self.counts.reindex(index, fill_value=self._floor())
+            + other.counts.reindex(index, fill_value=other._floor())
+        )
+        self.saturated = self.saturated or other.saturated
+        self._truncate()
+        return self
+
+    def _floor(self):
+        # Any value not tracked by a saturated summary occurred at most this often
+        return int(self.counts.min()) if self.saturated else 0
+
+    def _truncate(self):
+        if len(self.counts) > self.capacity:
+            self.counts = self.counts.nlargest(self.capacity, keep='first')
+            self.saturated = True
+
+    def distinct(self):
+        """Exact number of distinct values, or None once the sketch has overflowed."""
+        return None if self.saturated else len(self.counts)
+
+    def top(self, k=TOP_VALUES):
+        return self.counts.sort_values(ascending=False, kind='stable').head(k)
+
+class HyperLogLog:
+    """Cardinality estimate from ``2**precision`` registers of 64-bit hashes."""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values):
+        values = pd.Series(values)
+        if len(values) == 0:
+            return self
+        hashes = pd.util.hash_array(values.to_numpy())
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        remainder = hashes & np.uint64((1 << (64 - self.precision)) - 1)
+        # Leading zeros of the remaining bits plus one; frexp's exponent is the bit length
+        bit_length = np.frexp(remainder.astype(np.float64))[1]
+        rank = (64 - self.precision - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+class CategoricalSketch:
+    """Top values and distinct count of a column in bounded memory.
+
+    Values are counted in bounded slices, so memory stays proportional to
+    the sketch capacity even when a whole file is passed in at once.
+    HyperLogLog only depends on the set of distinct values, so it hashes
+    each slice's distinct values rather than every row, and is not built at
+    all until the top-k sketch overflows: until then the count is exact.
+    """
+
+    def __init__(self, capacity=STATS_TOP_K_CAPACITY, precision=HLL_PRECISION):
+        self.top_k = SpaceSaving(capacity)
+        self.precision = precision
+        self._cardinality = None
+
+    def _hll(self):
+        if self._cardinality is None:
+            # Before overflowing, the sketch holds every distinct value seen
+            self._cardinality = HyperLogLog(self.precision).update(self.top_k.counts.index)
+        return self._cardinality
+
+    def _overflows(self, n_new):
+        return self._cardinality is not None or len(self.top_k.counts) + n_new > self.top_k.capacity
+
+    def update(self, values, slice_rows=CHUNK_ROWS):
+        """Fold in values ``slice_rows`` at a time, so no full value table is ever built."""
+        values = pd.Series(values)
+        for start in range(0, len(values), slice_rows):
+            counts = values.iloc[start:start + slice_rows].dropna().value_counts()
+            if self._overflows(len(counts)):
+                self._hll().update(counts.index)
+            self.top_k.add_counts(counts)
+        return self
+
+    def merge(self, other):
+        if self._overflows(len(other.top_k.counts)) or other._cardinality is not None:
+            self._hll().merge(other._hll())
+        self.top_k.merge(other.top_k)
+        return self
+
+    def result(self):
+        distinct = self.top_k.distinct()
+        return {
+            'type': 'categorical',
+            'unique_values': distinct if distinct is not None else self._hll().estimate(),
+            'top_values': {str(value): int(count) for value, count in self.top_k.top().items()}
+        }
+
+class ColumnStats:
+    """Mergeable per-column statistics for a log file.
+
+    ``update`` folds in a chunk of rows, ``merge`` combines accumulators
+    built from other chunks, files or worker processes (they pickle), and
+    ``result`` returns the ``calculate_column_stats`` format. Memory is
+    bounded per column regardless of row count or cardinality.
+    """
+
+    def __init__(self, capacity=STATS_TOP_K_CAPACITY, precision=HLL_PRECISION):
+        self.capacity = capacity
+        self.precision = precision
+        self.columns = {}
+
+    def update(self, df, column_types, converted=None):
+        for column in df.columns:
+            accumulator = self.columns.get(column)
+            if column_types[column] == 'numeric':
+                if accumulator is None:
+                    accumulator = self.columns[column] = NumericMoments()
+                values = converted[column] if converted is not None else pd.to_numeric(df[column], errors='coerce')
+                accumulator.update(values)
+            else:
+                if accumulator is None:
+                    accumulator = self.columns[column] = CategoricalSketch(self.capacity, self.precision)
+                accumulator.update(df[column])
+        return self
+
+    def merge(self, other):
+        for column, accumulator in other.columns.items():
+            if column in self.columns:
+                self.columns[column].merge(accumulator)
+            else:
+                self.columns[column] = accumulator
+        return self
+
+    def result(self):
+        return {column: accumulator.result() for column, accumulator in self.columns.items()}
@@ -0,0 +1,59 @@
+"""Local stand-ins for the Windows security tools, used with ``COMMAND_SET=stub``.
+
+Run as ``python -m services.command_stubs <tool> [args...]``. Output mimics
+the real tools closely enough to exercise the command runner:
+
+- ``sc query [count]`` lists ``count`` services (default 50), so a large
+  count reproduces a huge ``sc query`` output
+- ``reg query <key>`` prints a value; a key containing ``Hang`` starts a
+  child process and never returns, like a hung query, and one containing
+  ``Detach`` closes its output first and then never returns
+- ``netsh ...`` and anything else prints ``Ok.``
+"""
+import os
+import subprocess
+import sys
+import time
+
+def sc(args):
+    if not args or args[0].lower() != 'query':
+        print('[SC] The command completed successfully.')
+        return 0
+    count = int(args[1]) if len(args) > 1 and args[1].isdigit() else 50
+    for i in range(count):
+        print(f'SERVICE_NAME: StubService{i}')
+        print(f'DISPLAY_NAME: Stub Service {i}')
+        print('        TYPE               : 10  WIN32_OWN_PROCESS')
+        print('        STATE              : 4  RUNNING')
+        print('        WIN32_EXIT_CODE    : 0  (0x0)')
+        print('')
+    return 0
+
+def reg(args):
+    key = args[1] if len(args) > 1 else ''
+    if 'detach' in key.lower():
+        os.close(sys.stdout.fileno())
+        os.close(sys.stderr.fileno())
+        time.sleep(3600)
+    if 'hang' in key.lower():
+        # A child keeps running too, so only killing the whole tree stops it
+        subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(3600)'])
+        time.sleep(3600)
+    if not key:
+        print('ERROR: Invalid syntax.', file=sys.stderr)
+        return 1
+    print(key)
+    print('    EnableFirewall    REG_DWORD    0x1')
+    return 0
+
+def main(argv):
+    tool = argv[0].lower() if argv else ''
+    if tool == 'sc':
+        return sc(argv[1:])
+    if tool == 'reg':
+        return reg(argv[1:])
+    print('Ok.')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
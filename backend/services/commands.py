@@ -0,0 +1,274 @@
+import asyncio
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from services.metrics import metrics
+
+COMMAND_MAX_CONCURRENCY = int(os.getenv('COMMAND_MAX_CONCURRENCY', 4))
+COMMAND_MAX_PER_CLIENT = int(os.getenv('COMMAND_MAX_PER_CLIENT', 2))
+COMMAND_TIMEOUT_SECONDS = float(os.getenv('COMMAND_TIMEOUT_SECONDS', 30))
+# stdout and stderr bytes kept per command; past this the command is killed
+COMMAND_MAX_OUTPUT_BYTES = int(os.getenv('COMMAND_MAX_OUTPUT_BYTES', 1024 * 1024))
+# Longer lines are split so one runaway line cannot exhaust memory
+COMMAND_MAX_LINE_BYTES = 64 * 1024
+# "windows" runs the real tools; "stub" runs services.command_stubs instead
+COMMAND_SET = os.getenv('COMMAND_SET', 'windows').lower()
+READ_CHUNK_BYTES = 64 * 1024
+
+# Only security configuration commands may be executed
+ALLOWED_COMMANDS = ('netsh advfirewall', 'wf.msc', 'netsh firewall', 'sc', 'reg')
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class CommandNotAllowedError(ValueError):
+    """Raised for commands outside the allowed security tool set."""
+
+class CommandLimitError(RuntimeError):
+    """Raised when a client already runs as many commands as it may."""
+
+def command_args(command, command_set=COMMAND_SET):
+    """Validate ``command`` and split it into the argument list to execute.
+
+    Commands run without a shell, so ``&``, ``|`` or ``;`` cannot chain
+    anything onto an allowed command.
+    """
+    command = command.strip()
+    lowered = command.lower()
+    if not any(lowered == allowed or lowered.startswith(allowed + ' ') for allowed in ALLOWED_COMMANDS):
+        raise CommandNotAllowedError(
+            "Command not allowed. Only security configuration commands are permitted."
+        )
+    # Non-POSIX splitting keeps the backslashes of registry keys and Windows paths
+    args = [
+        arg[1:-1] if len(arg) > 1 and arg[0] == arg[-1] and arg[0] in '"\'' else arg
+        for arg in shlex.split(command, posix=False)
+    ]
+    if command_set == 'stub':
+        return [sys.executable, '-m', 'services.command_stubs'] + args
+    if args[0].lower().endswith('.msc'):
+        # Snap-ins are documents, opened by the management console
+        return ['mmc'] + args
+    return args
+
+def kill_tree(process):
+    """Kill a process and everything it started."""
+    if process.returncode is not None:
+        return
+    try:
+        if os.name == 'nt':
+            subprocess.run(['taskkill', '/F', '/T', '/PID', str(process.pid)], capture_output=True)
+        else:
+            # The command leads its own session, so its process group is the whole tree
+            os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, OSError):
+        pass
+
+async def _pump(stream, name, queue):
+    """Queue ``(name, line)`` for every line of ``stream`` and ``(name, None)`` at EOF."""
+    buffer = b''
+    while True:
+        chunk = await stream.read(READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        while len(buffer) > COMMAND_MAX_LINE_BYTES:
+            lines.append(buffer[:COMMAND_MAX_LINE_BYTES])
+            buffer = buffer[COMMAND_MAX_LINE_BYTES:]
+        for line in lines:
+            await queue.put((name, line))
+    if buffer:
+        await queue.put((name, buffer))
+    await queue.put((name, None))
+
+class CommandRunner:
+    """Runs allowed commands with bounded concurrency, time and output.
+
+    At most ``max_concurrency`` commands run at once across all clients and
+    ``max_per_client`` per client. Each command is killed with its whole
+    process tree when it exceeds ``timeout`` seconds or
+    ``max_output_bytes`` of output. Output is streamed line by line as
+    events (``start``, ``line``, ``end``) and can be collected with ``run``.
+    """
+
+    def __init__(self, max_concurrency=COMMAND_MAX_CONCURRENCY, max_per_client=COMMAND_MAX_PER_CLIENT,
+                 timeout=COMMAND_TIMEOUT_SECONDS, max_output_bytes=COMMAND_MAX_OUTPUT_BYTES,
+                 command_set=COMMAND_SET):
+        self.max_per_client = max_per_client
+        self.timeout = timeout
+        self.max_output_bytes = max_output_bytes
+        self.command_set = command_set
+        self.max_concurrency = max_concurrency
+        # Created on first use: before Python 3.10 asyncio primitives bind to
+        # the loop current at creation, which at import time is not the server's
+        self._semaphore = None
+        self._client_slots = None
+        self._active = {}
+
+    @asynccontextmanager
+    async def _slot(self, client, wait):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._client_slots = asyncio.Condition()
+        async with self._client_slots:
+            if not wait and self._active.get(client, 0) >= self.max_per_client:
+                raise CommandLimitError(
+                    f"At most {self.max_per_client} commands may run at once per client"
+                )
+            await self._client_slots.wait_for(lambda: self._active.get(client, 0) < self.max_per_client)
+            self._active[client] = self._active.get(client, 0) + 1
+        try:
+            async with self._semaphore:
+                yield
+        finally:
+            async with self._client_slots:
+                self._active[client] -= 1
+                if not self._active[client]:
+                    del self._active[client]
+                self._client_slots.notify_all()
+
+    async def stream(self, command, client=None, wait=False):
+        """Run ``command`` and yield its events as dicts.
+
+        Raises ``CommandNotAllowedError`` before anything runs, and
+        ``CommandLimitError`` when ``client`` is at its limit (unless
+        ``wait`` is set, then it queues). Closing the generator early kills
+        the command.
+        """
+        args = command_args(command, self.command_set)
+        async with self._slot(client, wait):
+            start = time.perf_counter()
+            process = await asyncio.create_subprocess_exec(
+                *args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=BACKEND_DIR if self.command_set == 'stub' else None,
+                start_new_session=os.name != 'nt'
+            )
+            queue = asyncio.Queue()
+            pumps = [
+                asyncio.ensure_future(_pump(process.stdout, 'stdout', queue)),
+                asyncio.ensure_future(_pump(process.stderr, 'stderr', queue))
+            ]
+            deadline = time.monotonic() + self.timeout
+            output_bytes = 0
+            open_streams = 2
+            timed_out = truncated = False
+            outcome = 'error'
+            try:
+                yield {'event': 'start', 'command': command, 'pid': process.pid}
+                while open_streams:
+                    try:
+                        name, line = await asyncio.wait_for(queue.get(), deadline - time.monotonic())
+                    except asyncio.TimeoutError:
+                        timed_out = True
+                        break
+                    if line is None:
+                        open_streams -= 1
+                        continue
+                    output_bytes += len(line) + 1
+                    if output_bytes > self.max_output_bytes:
+                        truncated = True
+                        break
+                    yield {'event': 'line', 'stream': name, 'line': line.decode('utf-8', errors='replace').rstrip('\r')}
+                if not (timed_out or truncated):
+                    # Closing both pipes does not end the command: keep its deadline
+                    try:
+                        returncode = await asyncio.wait_for(
+                            process.wait(), max(deadline - time.monotonic(), 0)
+                        )
+                    except asyncio.TimeoutError:
+                        timed_out = True
+                if timed_out or truncated:
+                    kill_tree(process)
+                    returncode = await process.wait()
+                if timed_out:
+                    outcome = 'timeout'
+                elif truncated:
+                    outcome = 'truncated'
+                elif returncode == 0:
+                    outcome = 'success'
+                yield {
+                    'event': 'end',
+                    'command': command,
+                    'returncode': returncode,
+                    'success': outcome == 'success',
+                    'timed_out': timed_out,
+                    'truncated': truncated,
+                    'duration_seconds': round(time.perf_counter() - start, 3)
+                }
+            finally:
+                # Reached early when the consumer goes away: do not leave the command running
+                kill_tree(process)
+                for pump in pumps:
+                    pump.cancel()
+                metrics.inc('soc_commands_total', help_text="Executed security commands", outcome=outcome)
+
+    async def run(self, command, client=None, wait=False):
+        """Run ``command`` to completion and return its collected output."""
+        output, errors = [], []
+        result = None
+        # Exhaust the stream rather than returning from the loop: its slot is
+        # only released once the generator finishes
+        async for event in self.stream(command, client, wait):
+            if event['event'] == 'line':
+                (output if event['stream'] == 'stdout' else errors).append(event['line'])
+            elif event['event'] == 'end':
+                result = dict(event, output='\n'.join(output))
+                del result['event']
+                if not result['success']:
+                    if event['timed_out']:
+                        errors.append(f"Command timed out after {self.timeout:g} seconds")
+                    elif event['truncated']:
+                        errors.append(f"Output exceeded {self.max_output_bytes} bytes; command stopped")
+                    result['error'] = '\n'.join(errors)
+        return result
+
+    async def run_many(self, commands, client=None):
+        """Run several commands in parallel within the limits, in input order.
+
+        Commands that are not allowed get an error result instead of
+        failing the others.
+        """
+        async def run_one(command):
+            try:
+                return await self.run(command, client, wait=True)
+            except CommandNotAllowedError as e:
+                return {'command': command, 'success': False, 'output': '', 'error': str(e)}
+        return await asyncio.gather(*(run_one(command) for command in commands))
+
+    async def stream_many(self, commands, client=None):
+        """Yield the events of several commands run in parallel as they happen.
+
+        Every event carries the ``index`` of its command.
+        """
+        queue = asyncio.Queue()
+
+        async def forward(index, command):
+            try:
+                async for event in self.stream(command, client, wait=True):
+                    await queue.put(dict(event, index=index))
+            except CommandNotAllowedError as e:
+                await queue.put({'event': 'end', 'index': index, 'command': command,
+                                 'success': False, 'error': str(e)})
+            finally:
+                await queue.put(None)
+
+        tasks = [asyncio.ensure_future(forward(i, command)) for i, command in enumerate(commands)]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                event = await queue.get()
+                if event is None:
+                    remaining -= 1
+                else:
+                    yield event
+        finally:
+            for task in tasks:
+                task.cancel()
+
+command_runner = CommandRunner()
@@ -0,0 +1,100 @@
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+from services.schema import sample_column
+
+ENCODING_MODES = ('label', 'hash', 'auto')
+# How categorical columns become features: a fitted vocabulary, hashed vectors, or chosen per column
+CATEGORICAL_ENCODING = os.getenv('CATEGORICAL_ENCODING', 'label').lower()
+# Features each hashed column is spread over
+HASH_BUCKETS = int(os.getenv('HASH_BUCKETS', 16))
+# Values seen fewer times than this when fitting encode as all zeros (0 disables collapsing)
+HASH_MIN_COUNT = int(os.getenv('HASH_MIN_COUNT', 0))
+# In auto mode, columns with more distinct values than this in a sample are hashed
+AUTO_MAX_LABELS = int(os.getenv('ENCODING_AUTO_MAX_LABELS', 100))
+
+class HashingEncoder:
+    """Signed feature hashing of a categorical column into ``n_buckets`` features.
+
+    Each value sets one feature, chosen by its 64-bit pandas hash modulo
+    ``n_buckets``, to +1 or -1 by another bit of the hash. The features are
+    stable across files and processes, need no vocabulary and have a fixed
+    width, and a collision or an unseen value is just another bucket rather
+    than a jump along one numeric axis. With ``min_count``, values seen
+    fewer times than that when fitting (and values never seen) encode as
+    all zeros; only the hashes of the frequent values are kept.
+    """
+
+    def __init__(self, n_buckets=HASH_BUCKETS, min_count=HASH_MIN_COUNT):
+        self.n_buckets = n_buckets
+        self.min_count = min_count
+        self.frequent = None
+
+    @staticmethod
+    def _hash(values):
+        # Hash as Python strings so object and Arrow-backed columns agree
+        return pd.util.hash_array(pd.Series(values).astype(str).to_numpy(dtype=object))
+
+    def fit(self, values):
+        if self.min_count > 1:
+            hashes, counts = np.unique(self._hash(values), return_counts=True)
+            self.frequent = hashes[counts >= self.min_count]
+        return self
+
+    def transform(self, values):
+        hashes = self._hash(values)
+        features = np.zeros((len(hashes), self.n_buckets), dtype=np.float32)
+        buckets = (hashes % np.uint64(self.n_buckets)).astype(np.int64)
+        signs = np.where(hashes >> np.uint64(63), -1.0, 1.0).astype(np.float32)
+        features[np.arange(len(hashes)), buckets] = signs
+        if self.frequent is not None:
+            features[~np.isin(hashes, self.frequent)] = 0
+        return features
+
+    def fit_transform(self, values):
+        return self.fit(values).transform(values)
+
+    def __repr__(self):
+        frequent = 'all' if self.frequent is None else hashlib.sha256(self.frequent.tobytes()).hexdigest()[:16]
+        return f"HashingEncoder(n_buckets={self.n_buckets}, min_count={self.min_count}, frequent={frequent})"
+
+def resolve_encoding(encoding=None):
+    encoding = (encoding or CATEGORICAL_ENCODING).lower()
+    if encoding not in ENCODING_MODES:
+        raise ValueError(f"Unknown categorical encoding '{encoding}'. Use one of: {', '.join(ENCODING_MODES)}")
+    return encoding
+
+def create_encoder(series, encoding=None):
+    """Return an unfitted encoder for a categorical column.
+
+    ``auto`` hashes high-cardinality columns (messages, IPs, user agents)
+    and keeps exact label codes for small vocabularies like log levels.
+    """
+    encoding = resolve_encoding(encoding)
+    if encoding == 'auto':
+        encoding = 'hash' if sample_column(series).nunique() > AUTO_MAX_LABELS else 'label'
+    if encoding == 'hash':
+        return HashingEncoder()
+    # Imported on first use so loading this module stays cheap
+    from sklearn.preprocessing import LabelEncoder
+    return LabelEncoder()
+
+def encode_values(encoder, series):
+    """Encode values with a fitted encoder, mapping values a LabelEncoder never saw to -1."""
+    if isinstance(encoder, HashingEncoder):
+        return encoder.transform(series)
+    return pd.Index(encoder.classes_).get_indexer(series)
+
+def encoded_widths(columns, label_encoders):
+    """Number of features each column is encoded into, in column order."""
+    return [
+        label_encoders[column].n_buckets if isinstance(label_encoders.get(column), HashingEncoder) else 1
+        for column in columns
+    ]
+
+def encoder_fingerprint(encoder):
+    """Text that changes whenever the encoder's mapping does."""
+    if isinstance(encoder, HashingEncoder):
+        return repr(encoder)
+    return '\x00'.join(map(str, encoder.classes_))
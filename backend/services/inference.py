@@ -0,0 +1,136 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from services.metrics import metrics
+
+# Most windows coalesced into one forward pass
+INFERENCE_MAX_BATCH_WINDOWS = int(os.getenv('INFERENCE_MAX_BATCH_WINDOWS', 4096))
+# Longest a request waits for others to join its batch
+INFERENCE_MAX_WAIT_MS = float(os.getenv('INFERENCE_MAX_WAIT_MS', 5))
+# A model's worker thread exits after this long without requests
+INFERENCE_IDLE_SECONDS = float(os.getenv('INFERENCE_IDLE_SECONDS', 60))
+
+class _ScoreRequest:
+    def __init__(self, windows):
+        self.windows = windows
+        self.future = Future()
+
+class InferenceService:
+    """Coalesces concurrent scoring requests for the same model into batches.
+
+    Each model gets a worker thread that waits up to ``max_wait_ms`` after
+    the first queued request for others to arrive, then runs up to
+    ``max_batch_windows`` windows through one forward pass and hands every
+    caller its slice of the errors. Requests at least a full batch in size
+    gain nothing from waiting and are scored directly. A worker exits once
+    its model has been idle for ``idle_seconds`` or is released, and is
+    started again by the next request.
+    """
+
+    def __init__(self, max_batch_windows=INFERENCE_MAX_BATCH_WINDOWS, max_wait_ms=INFERENCE_MAX_WAIT_MS,
+                 idle_seconds=INFERENCE_IDLE_SECONDS):
+        self.max_batch_windows = max_batch_windows
+        self.max_wait = max_wait_ms / 1000.0
+        self.idle_seconds = idle_seconds
+        self._queues = {}
+        self._lock = threading.Lock()
+
+    def score(self, model, sequences, update_threshold=False):
+        """Score windows like ``model.score``, batched with other callers of ``model``."""
+        sequences = np.asarray(sequences, dtype=np.float32)
+        if len(sequences) >= self.max_batch_windows:
+            feature_errors = model.feature_errors(sequences, self.max_batch_windows)
+        else:
+            request = _ScoreRequest(np.ascontiguousarray(sequences))
+            self._submit(model, request)
+            feature_errors = request.future.result()
+        return model.score_errors(feature_errors, update_threshold)
+
+    def _submit(self, model, request):
+        key = id(model)
+        # Queued under the lock so a worker never stops with a request behind it
+        with self._lock:
+            entry = self._queues.get(key)
+            if entry is None:
+                requests = queue.Queue()
+                worker = threading.Thread(
+                    target=self._run, args=(model, requests), name=f"inference-{key}", daemon=True
+                )
+                # Keep a reference to the model so its id cannot be reused while queued
+                entry = self._queues[key] = (model, requests)
+                worker.start()
+            entry[1].put(request)
+
+    def _stop_if_idle(self, model, requests):
+        with self._lock:
+            entry = self._queues.get(id(model))
+            if not requests.empty() or entry is None or entry[1] is not requests:
+                return False
+            del self._queues[id(model)]
+            return True
+
+    def _run(self, model, requests):
+        while True:
+            try:
+                first = requests.get(timeout=self.idle_seconds)
+            except queue.Empty:
+                if self._stop_if_idle(model, requests):
+                    return
+                continue
+            if first is None:
+                return
+            pending = [first]
+            size = len(first.windows)
+            deadline = time.monotonic() + self.max_wait
+            stop = False
+            while size < self.max_batch_windows:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                pending.append(request)
+                size += len(request.windows)
+            self._execute(model, pending)
+            if stop:
+                return
+
+    def _execute(self, model, pending):
+        try:
+            batch = np.concatenate([request.windows for request in pending])
+            feature_errors = model.feature_errors(batch, self.max_batch_windows)
+        except Exception as e:
+            for request in pending:
+                request.future.set_exception(e)
+            return
+
+        metrics.inc('soc_inference_batches_total', help_text="Coalesced inference batches")
+        metrics.inc('soc_inference_requests_total', len(pending), "Scoring requests served by batches")
+        metrics.inc('soc_inference_windows_total', len(batch), "Windows scored in coalesced batches")
+        offset = 0
+        for request in pending:
+            request.future.set_result(feature_errors[offset:offset + len(request.windows)])
+            offset += len(request.windows)
+
+    def release(self, model):
+        """Stop the worker for a model that is no longer used."""
+        with self._lock:
+            entry = self._queues.pop(id(model), None)
+            if entry is not None:
+                entry[1].put(None)
+
+    def shutdown(self):
+        with self._lock:
+            for _, requests in self._queues.values():
+                requests.put(None)
+            self._queues.clear()
+
+inference_service = InferenceService()
@@ -0,0 +1,90 @@
+import json
+import os
+import re
+from itertools import islice
+import pandas as pd
+from services.parsers import detect_template
+
+# Files larger than this are analyzed chunk by chunk
+STREAMING_THRESHOLD_BYTES = int(os.getenv('STREAMING_THRESHOLD_BYTES', 256 * 1024 * 1024))
+CHUNK_ROWS = int(os.getenv('INGEST_CHUNK_ROWS', 50000))
+# Bump whenever parsing output changes so cached parsed frames are not reused
+PARSER_VERSION = 1
+
+def parse_text_lines(lines, template=None):
+    """Parse raw text log lines into a DataFrame.
+
+    Lines matching ``template`` (auto-detected when not given) are extracted
+    into typed columns in one vectorized pass; the rest use the generic path.
+    """
+    lines = list(lines)
+    if template is None:
+        template = detect_template(lines)
+    if template is None:
+        return parse_generic_lines(lines)
+
+    series = pd.Series(lines, dtype=object).str.rstrip('\r\n')
+    df, matched = template.extract(series)
+    if matched.all():
+        return df.reset_index(drop=True)
+
+    unmatched = [line for line, ok in zip(lines, matched) if not ok]
+    generic = parse_generic_lines(unmatched)
+    generic.index = matched.index[~matched]
+    return pd.concat([df, generic]).sort_index().reset_index(drop=True)
+
+def parse_generic_lines(lines):
+    """Parse lines as JSON objects or delimiter-separated fields."""
+    parsed_logs = []
+    for line in lines:
+        stripped = line.strip()
+        parsed = None
+        if stripped.startswith('{'):
+            try:
+                # Try to parse JSON
+                parsed = json.loads(stripped)
+            except ValueError:
+                parsed = None
+        if not isinstance(parsed, dict):
+            # If not JSON, split by common delimiters
+            parts = re.split(r'[\t|,]', stripped)
+            parsed = {f'field_{i}': part for i, part in enumerate(parts)}
+        parsed_logs.append(parsed)
+    return pd.DataFrame(parsed_logs)
+
+def load_log_file(log_file):
+    """Load a whole log file into a DataFrame."""
+    if log_file.endswith('.csv'):
+        return pd.read_csv(log_file)
+    # For non-CSV files, try to parse as text logs
+    with open(log_file, 'r') as f:
+        return parse_text_lines(f.read().splitlines())
+
+def iter_log_chunks(log_file, chunk_rows=CHUNK_ROWS):
+    """Yield a log file as DataFrames of at most ``chunk_rows`` rows.
+
+    The index of every chunk continues from the previous one so row
+    positions stay global across the file.
+    """
+    if log_file.endswith('.csv'):
+        yield from pd.read_csv(log_file, chunksize=chunk_rows)
+        return
+
+    offset = 0
+    template = None
+    with open(log_file, 'r') as f:
+        while True:
+            lines = list(islice(f, chunk_rows))
+            if not lines:
+                break
+            # Detect the format once and reuse it for every chunk
+            if offset == 0:
+                template = detect_template(lines)
+            chunk = parse_text_lines(lines, template) if template else parse_generic_lines(lines)
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield chunk
+
+def should_stream(log_file):
+    """Decide whether a file is large enough to need chunked analysis."""
+    return os.path.getsize(log_file) > STREAMING_THRESHOLD_BYTES
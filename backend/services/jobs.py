@@ -0,0 +1,175 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+MAX_WORKERS = int(os.getenv('ANALYSIS_WORKERS', os.cpu_count() or 1))
+MAX_QUEUE_DEPTH = int(os.getenv('ANALYSIS_MAX_QUEUE_DEPTH', 32))
+# Finished jobs kept around for status/result lookups
+MAX_FINISHED_JOBS = int(os.getenv('ANALYSIS_MAX_FINISHED_JOBS', 256))
+# Threads in the API process that coordinate batch jobs fanning out to the pool
+MAX_COORDINATORS = int(os.getenv('ANALYSIS_MAX_COORDINATORS', 2))
+# How often a coordinator retries while the queue is full
+QUEUE_RETRY_SECONDS = 0.5
+
+class QueueFullError(Exception):
+    """Raised when the analysis queue is at capacity."""
+
+class JobManager:
+    """Runs CPU-heavy analyses in a bounded process pool.
+
+    Work is executed in worker processes so the event loop stays responsive.
+    At most ``max_queue_depth`` jobs may be queued or running at once.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, max_queue_depth=MAX_QUEUE_DEPTH,
+                 max_finished=MAX_FINISHED_JOBS):
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self.max_finished = max_finished
+        self._executor = None
+        self._coordinator = None
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            # Spawn rather than fork: TensorFlow is not fork-safe once initialized
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def queue_depth(self):
+        """Number of jobs queued or running."""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job['future'].done())
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue ``fn(*args, **kwargs)`` in the pool and return its job id."""
+        return self._submit(self._get_executor(), False, fn, *args, **kwargs)[0]
+
+    def submit_local(self, fn, *args, **kwargs):
+        """Run ``fn`` on a coordinator thread in this process and return its job id.
+
+        For jobs that fan work out to the pool themselves (see
+        ``submit_waiting``) and would otherwise hold a worker process idle.
+        They are counted against the queue depth separately from pool jobs so
+        queued coordinators can never starve the pool work they wait on.
+        """
+        with self._lock:
+            if self._coordinator is None:
+                self._coordinator = ThreadPoolExecutor(
+                    max_workers=MAX_COORDINATORS, thread_name_prefix='analysis-coordinator'
+                )
+        return self._submit(self._coordinator, True, fn, *args, **kwargs)[0]
+
+    def submit_waiting(self, fn, *args, **kwargs):
+        """Queue ``fn`` in the pool once there is room and return its Future.
+
+        Used by coordinators, which should yield to interactive requests
+        rather than fail when the queue is full.
+        """
+        while True:
+            try:
+                return self._submit(self._get_executor(), False, fn, *args, **kwargs)[1]
+            except QueueFullError:
+                time.sleep(QUEUE_RETRY_SECONDS)
+
+    def _submit(self, executor, local, fn, *args, **kwargs):
+        with self._lock:
+            pending = sum(
+                1 for job in self._jobs.values()
+                if not job['future'].done() and job['local'] == local
+            )
+            if pending >= self.max_queue_depth:
+                raise QueueFullError(
+                    f"Analysis queue is full ({pending}/{self.max_queue_depth} jobs)"
+                )
+            job_id = uuid.uuid4().hex
+            future = executor.submit(fn, *args, **kwargs)
+            self._jobs[job_id] = {
+                'future': future,
+                'submitted_at': time.time(),
+                'finished_at': None,
+                'local': local
+            }
+            self._evict_finished()
+        future.add_done_callback(lambda _: self._mark_finished(job_id))
+        return job_id, future
+
+    async def run(self, fn, *args, **kwargs):
+        """Run ``fn`` in the pool and wait for its result without blocking the loop."""
+        job_id = self.submit(fn, *args, **kwargs)
+        return await asyncio.wrap_future(self._jobs[job_id]['future'])
+
+    def add_done_callback(self, job_id, callback):
+        """Call ``callback(result)`` in the API process once the job succeeds."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+
+        def _on_done(future):
+            if not future.cancelled() and future.exception() is None:
+                callback(future.result())
+        job['future'].add_done_callback(_on_done)
+
+    def _mark_finished(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job['finished_at'] = time.time()
+
+    def _evict_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job['future'].done()]
+        for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self._jobs[job_id]
+
+    def status(self, job_id):
+        """Describe a job, or return None if it is unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+
+        future = job['future']
+        if future.done():
+            status = 'failed' if future.exception() is not None else 'completed'
+        elif future.running():
+            status = 'running'
+        else:
+            status = 'queued'
+
+        info = {
+            'job_id': job_id,
+            'status': status,
+            'submitted_at': job['submitted_at'],
+            'finished_at': job['finished_at']
+        }
+        if status == 'failed':
+            info['error'] = str(future.exception())
+        return info
+
+    def result(self, job_id):
+        """Return the result of a completed job (raises if the job failed)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        return job['future'].result(timeout=0)
+
+    def shutdown(self):
+        if self._coordinator is not None:
+            self._coordinator.shutdown(wait=False, cancel_futures=True)
+            self._coordinator = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+job_manager = JobManager()
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import time
+import uuid
+from services.anomaly_store import anomaly_store
+from services.model_registry import model_registry
+from services.inference import inference_service
+
+logger = logging.getLogger(__name__)
+
+# Anomalies buffered per subscriber before the oldest are dropped
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+class LiveSource:
+    """Rolling scoring state for one continuously ingested log source.
+
+    The source is bound to a pre-trained registry model on its first batch
+    of lines; afterwards only the last ``sequence_length - 1`` scaled rows
+    are kept so every new row completes exactly one new window.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.state = None
+        self.template = None
+        self.rows_seen = 0
+        self.carry_df = None
+        self.carry_features = None
+
+    def _bind(self, lines):
+        from services.ingest import parse_text_lines
+        from services.encoding import encoded_widths
+        from services.parsers import detect_template
+        from services.schema import infer_column_types
+
+        self.template = detect_template(lines)
+        df = parse_text_lines(lines, self.template)
+        column_types = infer_column_types(df, source=self.name)
+        key, entry = model_registry.find(df.columns, column_types)
+        if entry is None:
+            raise ValueError(
+                "No trained model matches this log schema; analyze a sample file first"
+            )
+        self.state = {
+            'key': key,
+            'detector': entry['detector'],
+            'model': entry['model'],
+            'columns': entry['columns'],
+            'column_types': entry['column_types'],
+            'label_encoders': entry['label_encoders'],
+            'feature_widths': encoded_widths(entry['columns'], entry['label_encoders']),
+            'is_new': False
+        }
+        return df
+
+    def score_lines(self, lines):
+        """Score new raw log lines and return the anomalies they complete."""
+        # The pandas/numpy pipeline is imported on first use to keep startup fast
+        import numpy as np
+        import pandas as pd
+        from services.ingest import parse_text_lines
+        from services.schema import convert_columns, event_times
+        from services.log_analyzer import transform_features, make_sequences, build_anomalies, column_errors
+
+        lines = [line for line in lines if line.strip()]
+        if not lines:
+            return []
+        if self.state is None:
+            df = self._bind(lines)
+        elif self.template is not None:
+            df = parse_text_lines(lines, self.template)
+        else:
+            df = parse_text_lines(lines)
+
+        columns = self.state['columns']
+        df = df.reindex(columns=columns)
+        df.index = pd.RangeIndex(self.rows_seen, self.rows_seen + len(df))
+        self.rows_seen += len(df)
+
+        converted = convert_columns(df, self.state['column_types'])
+        features = transform_features(self.state, df, converted)
+
+        # Prepend the rolling window from earlier lines
+        if self.carry_df is not None:
+            window_df = pd.concat([self.carry_df, df])
+            features = np.vstack([self.carry_features, features])
+        else:
+            window_df = df
+        sequence_length = self.state['model'].sequence_length
+        split = max(len(window_df) - (sequence_length - 1), 0)
+        self.carry_df = window_df.iloc[split:]
+        self.carry_features = features[split:]
+        if len(window_df) < sequence_length:
+            return []
+
+        # Coalesced with other sources scoring against the same model
+        scored = column_errors(
+            self.state, inference_service.score(self.state['model'], make_sequences(features, sequence_length))
+        )
+        # Report the newest row of each window: that is the line that triggered it
+        mask = scored['anomalies'] == 1
+        rows = window_df.iloc[sequence_length - 1:].loc[mask]
+        column_types = self.state['column_types']
+        times = event_times(convert_columns(rows, column_types), column_types)
+        timestamps = None
+        if times is None:
+            # Without a timestamp column, label anomalies with the time they arrived
+            arrived = np.datetime_as_string(np.datetime64(time.time_ns(), 'ns'), unit='ms', timezone='UTC')
+            timestamps = [str(arrived)] * len(rows)
+        anomalies = build_anomalies(
+            rows, scored['scores'][mask], scored['confidence'][mask],
+            scored['feature_errors'][mask], timestamps, times
+        )
+        for anomaly in anomalies:
+            anomaly['source'] = self.name
+        return anomalies
+
+class LiveIngestHub:
+    """Tracks live sources and fans anomalies out to subscribers."""
+
+    def __init__(self):
+        self.sources = {}
+        self._locks = {}
+        self._subscribers = set()
+
+    async def ingest(self, source, lines):
+        """Score lines for ``source`` off the event loop and publish any anomalies."""
+        if source not in self.sources:
+            self.sources[source] = LiveSource(source)
+            self._locks[source] = asyncio.Lock()
+        # Serialize per source so the rolling window sees lines in order
+        async with self._locks[source]:
+            anomalies = await asyncio.to_thread(self.sources[source].score_lines, lines)
+        if anomalies:
+            await asyncio.to_thread(self.store, self.sources[source], anomalies, len(lines))
+        for anomaly in anomalies:
+            self.publish(anomaly)
+        return anomalies
+
+    def store(self, live_source, anomalies, lines):
+        """Persist one ingested batch's anomalies to the anomaly history."""
+        try:
+            anomaly_store.save(f"live-{uuid.uuid4().hex}", {
+                'anomalies': anomalies,
+                'detector': live_source.state['detector'],
+                'total_logs': lines
+            }, source=live_source.name)
+        except Exception as e:
+            logger.error(f"Error storing live anomalies: {str(e)}")
+
+    def publish(self, anomaly):
+        for queue in list(self._subscribers):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(anomaly)
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    def reset(self, source):
+        dropped = self.sources.pop(source, None)
+        self._locks.pop(source, None)
+        if dropped is not None and dropped.state is not None:
+            model = dropped.state['model']
+            # Other sources may score against the same registry model
+            if not any(live.state is not None and live.state['model'] is model for live in self.sources.values()):
+                inference_service.release(model)
+
+live_hub = LiveIngestHub()
@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from services.metrics import metrics
+
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 4))
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', 30))
+LLM_CACHE_TTL_SECONDS = float(os.getenv('LLM_CACHE_TTL_SECONDS', 3600))
+LLM_CACHE_SIZE = int(os.getenv('LLM_CACHE_SIZE', 1024))
+
+_NUMBER = re.compile(r'^-?\d+(?:\.\d+)?%?$')
+_DIGITS = re.compile(r'\d+')
+
+def _bucket_number(value):
+    """Round a number to two significant digits so near-identical values collide."""
+    if value == 0 or not math.isfinite(value):
+        return value
+    return round(value, 1 - int(math.floor(math.log10(abs(value)))))
+
+def _normalize_value(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return _bucket_number(float(value))
+    text = str(value).strip().lower()
+    if _NUMBER.match(text):
+        return _bucket_number(float(text.rstrip('%')))
+    # Mask digits so timestamps, ids and counters do not defeat the cache
+    return _DIGITS.sub('#', text)
+
+def _normalize_context(context):
+    if isinstance(context, str):
+        try:
+            context = json.loads(context)
+        except ValueError:
+            return _normalize_value(context)
+    if isinstance(context, dict):
+        return {str(key): _normalize_value(value) for key, value in sorted(context.items())}
+    return _normalize_value(context)
+
+def anomaly_fingerprint(kind, context, severity, score):
+    """Fingerprint an anomaly by its normalized context, severity and score bucket."""
+    payload = {
+        'kind': kind,
+        'context': _normalize_context(context),
+        'severity': str(severity).strip().lower(),
+        'score_bucket': round(float(score), 1)
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+class TTLCache:
+    """A small LRU cache whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, max_size=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+class LLMGateway:
+    """Async access to the generative model with bounded concurrency and caching.
+
+    Responses are cached by ``cache_key`` and concurrent requests for the
+    same key share a single in-flight call. Pass ``model_factory`` instead of
+    ``model`` to create the client on the first call rather than at startup.
+    """
+
+    def __init__(self, model=None, max_concurrency=LLM_MAX_CONCURRENCY, timeout=LLM_TIMEOUT_SECONDS,
+                 cache_size=LLM_CACHE_SIZE, cache_ttl=LLM_CACHE_TTL_SECONDS, model_factory=None):
+        if model is None and model_factory is None:
+            raise ValueError("Either model or model_factory is required")
+        self.model = model
+        self.model_factory = model_factory
+        self.timeout = timeout
+        self.cache = TTLCache(cache_size, cache_ttl)
+        self.max_concurrency = max_concurrency
+        # Created on first use: before Python 3.10 asyncio primitives bind to
+        # the loop current at creation, and the gateway is built at import time
+        self._model_lock = None
+        self._semaphore = None
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def generate(self, prompt, cache_key=None, **kwargs):
+        """Return the generated text for ``prompt`` (None if the model returned none)."""
+        if cache_key is None:
+            return await self._call(prompt, **kwargs)
+
+        cached = self.lookup(cache_key)
+        if cached is not None:
+            return cached
+
+        task = self._inflight.get(cache_key)
+        if task is None:
+            task = asyncio.ensure_future(self._call(prompt, **kwargs))
+            self._inflight[cache_key] = task
+            task.add_done_callback(lambda done: self._finish(cache_key, done))
+        # Shield the shared call so one disconnecting client does not cancel it for the rest
+        return await asyncio.shield(task)
+
+    def lookup(self, cache_key):
+        """Return the cached response for ``cache_key``, or None on a miss."""
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            self.hits += 1
+            metrics.inc('soc_llm_cache_requests_total', help_text="LLM cache lookups", result='hit')
+        else:
+            self.misses += 1
+            metrics.inc('soc_llm_cache_requests_total', help_text="LLM cache lookups", result='miss')
+        return cached
+
+    def store(self, cache_key, value):
+        """Cache a response obtained outside ``generate``, e.g. one part of a combined answer."""
+        self.cache.set(cache_key, value)
+
+    def _finish(self, cache_key, task):
+        self._inflight.pop(cache_key, None)
+        if not task.cancelled() and task.exception() is None and task.result():
+            self.cache.set(cache_key, task.result())
+
+    async def _get_model(self):
+        if self.model is None:
+            if self._model_lock is None:
+                self._model_lock = asyncio.Lock()
+            async with self._model_lock:
+                if self.model is None:
+                    # The client import is slow; keep it off the event loop
+                    self.model = await asyncio.to_thread(self.model_factory)
+        return self.model
+
+    async def _call(self, prompt, **kwargs):
+        model = await self._get_model()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            start = time.perf_counter()
+            outcome = 'error'
+            try:
+                response = await asyncio.wait_for(
+                    model.generate_content_async(prompt, **kwargs),
+                    timeout=self.timeout
+                )
+                outcome = 'success'
+            except asyncio.TimeoutError:
+                outcome = 'timeout'
+                raise
+            finally:
+                metrics.observe('soc_llm_request_seconds', time.perf_counter() - start,
+                                "Latency of LLM calls", outcome=outcome)
+        if not response:
+            return None
+        try:
+            return response.text
+        except ValueError:
+            # Blocked or empty candidates have no text
+            return None
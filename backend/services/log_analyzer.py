@@ -1,187 +1,594 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime
-import tensorflow as tf
-from models.lstm_autoencoder import LogAnalysisModel
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-import re
-import json
+from models.detectors import SEQUENCE_LENGTH, create_detector, resolve_detector_name, sliding_windows
+from services.model_registry import model_registry, schema_key
+from services.ingest import CHUNK_ROWS, load_log_file, iter_log_chunks, should_stream
+from services.metrics import StageTimings
+from services.column_stats import ColumnStats
+from services.encoding import create_encoder, encode_values, encoded_widths, resolve_encoding
+from services.parsed_cache import parsed_cache, preprocessing_fingerprint
+from services.schema import infer_column_types, convert_columns, timestamps_to_seconds, event_times
 import os
 
-def preprocess_dynamic_data(df):
-    """Preprocess any type of CSV data for analysis."""
+# Bump whenever analysis output changes so cached results are not reused
+ANALYZER_VERSION = 7
+
+# Epochs for a model trained from scratch
+FULL_TRAIN_EPOCHS = 5
+# Epochs when fine-tuning a per-source model on new data
+INCREMENTAL_EPOCHS = int(os.getenv('INCREMENTAL_EPOCHS', 1))
+# Retrain a per-source model from scratch after this many incremental updates...
+RETRAIN_AFTER_UPDATES = int(os.getenv('RETRAIN_AFTER_UPDATES', 50))
+# ...or when the median error on new data exceeds its training baseline by this factor
+RETRAIN_DRIFT_RATIO = float(os.getenv('RETRAIN_DRIFT_RATIO', 4.0))
+# Windows sampled to measure drift before an incremental update
+DRIFT_SAMPLE_WINDOWS = 10000
+
+def preprocess_dynamic_data(df, column_types=None, label_encoders=None, converted=None, encoding=None):
+    """Preprocess any type of CSV data for analysis.
+
+    When ``label_encoders`` is given the encoders are reused instead of refit,
+    so data can be scored against a previously trained model. ``converted``
+    takes the output of ``convert_columns`` so columns are not parsed twice.
+    ``encoding`` picks how categorical columns are encoded when fitting (see
+    ``services.encoding``); hashed columns need no vocabulary and take
+    several features each (see ``encoded_widths``).
+    """
     processed_data = []
-    label_encoders = {}
+    if column_types is None:
+        column_types = infer_column_types(df)
+    if converted is None:
+        converted = convert_columns(df, column_types)
+    fit_encoders = label_encoders is None
+    if fit_encoders:
+        label_encoders = {}
     
     for column in df.columns:
-        # Convert to string and handle NaN values
-        series = df[column].fillna('UNKNOWN').astype(str)
+        series = converted[column]
         
-        if is_numeric_column(df[column]):
-            # For numeric columns, convert to float
-            processed_data.append(pd.to_numeric(series, errors='coerce').fillna(0))
-        elif is_timestamp_column(df[column]):
+        if column_types[column] == 'numeric':
+            # For numeric columns, use the parsed floats
+            processed_data.append(series.fillna(0))
+        elif column_types[column] == 'timestamp':
             # For timestamp columns, convert to unix timestamp
-            timestamps = pd.to_datetime(series, errors='coerce')
-            processed_data.append(timestamps.astype('int64') // 10**9)
-        else:
-            # For categorical columns, use label encoding
-            label_encoders[column] = LabelEncoder()
+            processed_data.append(timestamps_to_seconds(series))
+        elif fit_encoders:
+            # For categorical columns, use label or hash encoding
+            label_encoders[column] = create_encoder(series, encoding)
             processed_data.append(label_encoders[column].fit_transform(series))
+        else:
+            processed_data.append(encode_values(label_encoders[column], series))
     
     # Stack all processed columns
     return np.column_stack(processed_data), label_encoders
 
-def is_numeric_column(series):
-    """Check if a column contains numeric data."""
-    try:
-        pd.to_numeric(series, errors='raise')
-        return True
-    except:
-        return False
+def shared_column_types(df, column_types=None, source=None):
+    """Reuse ``column_types`` when it covers every column of ``df``, else infer them."""
+    if column_types is not None and all(column in column_types for column in df.columns):
+        return {column: column_types[column] for column in df.columns}
+    return infer_column_types(df, source)
 
-def is_timestamp_column(series):
-    """Check if a column contains timestamp data."""
-    try:
-        pd.to_datetime(series, errors='raise')
-        return True
-    except:
-        return False
+def calculate_column_stats(df, column_types=None, converted=None):
+    """Calculate statistics for each column.
 
-def calculate_column_stats(df):
-    """Calculate statistics for each column."""
-    stats = {}
-    for column in df.columns:
-        if is_numeric_column(df[column]):
-            stats[column] = {
-                'type': 'numeric',
-                'mean': float(df[column].mean()),
-                'std': float(df[column].std()),
-                'min': float(df[column].min()),
-                'max': float(df[column].max())
-            }
+    Numeric moments come from one pass per column and categorical top
+    values and cardinality from bounded sketches (see ``ColumnStats``).
+    """
+    if column_types is None:
+        column_types = infer_column_types(df)
+    return ColumnStats().update(df, column_types, converted).result()
+
+def resolve_model(df, sequence_length, column_types, converted=None, detector=None, source=None,
+                  cache_entry=None, encoding=None):
+    """Look up the model state for the schema of ``df`` and scale its features.
+
+    Returns ``(state, features_scaled)``. On a registry miss a new scaler and
+    label encoders are fitted on ``df`` and ``state['is_new']`` is True; the
+    model is trained on the first call to ``score_sequences``. ``detector``
+    names the engine (see ``models.detectors``); ``auto`` picks one by size.
+    With a ``source`` the model belongs to that log producer and keeps
+    learning: its scaler is updated with ``partial_fit`` on every batch, on
+    a copy that is only registered once the analysis succeeds.
+    ``cache_entry`` (see ``parsed_cache``) holds preprocessing results of
+    earlier analyses of the same content; scaled features are then loaded
+    memory-mapped instead of being recomputed. ``encoding`` is the
+    categorical encoding mode for new models (see ``services.encoding``).
+    """
+    n_features = len(df.columns)
+    detector = resolve_detector_name(detector, len(df), n_features, sequence_length)
+    encoding = resolve_encoding(encoding)
+    key = schema_key(df.columns, column_types, sequence_length, n_features, detector, source, encoding)
+    # A per-source model is updated on a private copy of its latest saved state;
+    # the shared entry only changes once ``save_source_model`` commits the analysis
+    entry = model_registry.load(key) if source is not None else model_registry.get(key)
+    
+    features_cached = False
+    if entry is not None:
+        model = entry['model']
+        label_encoders = entry['label_encoders']
+        if source is not None:
+            features, _ = preprocess_dynamic_data(df, column_types, label_encoders, converted)
+            model.scaler.partial_fit(features)
+            features_scaled = model.scaler.transform(features)
         else:
-            value_counts = df[column].value_counts()
-            stats[column] = {
-                'type': 'categorical',
-                'unique_values': len(value_counts),
-                'top_values': value_counts.head(5).to_dict()
-            }
-    return stats
-
-def analyze_logs(log_file):
-    """Analyze any type of log file."""
-    try:
-        # Load the data
-        if log_file.endswith('.csv'):
-            df = pd.read_csv(log_file)
+            features_scaled, features_cached = cached_features(
+                cache_entry, df, column_types, label_encoders, model.scaler, converted
+            )
+    else:
+        # A fresh fit is deterministic, so one cached for this content can be reused
+        fresh = parsed_cache.load_fresh_state(cache_entry, column_types, encoding) if cache_entry else None
+        if fresh is not None:
+            label_encoders, scaler = fresh
         else:
-            # For non-CSV files, try to parse as text logs
-            with open(log_file, 'r') as f:
-                lines = f.readlines()
-            parsed_logs = []
-            for line in lines:
-                try:
-                    # Try to parse JSON
-                    parsed = json.loads(line)
-                except:
-                    # If not JSON, split by common delimiters
-                    parts = re.split(r'[\t|,]', line.strip())
-                    parsed = {f'field_{i}': part for i, part in enumerate(parts)}
-                parsed_logs.append(parsed)
-            df = pd.DataFrame(parsed_logs)
-
-        # Calculate basic statistics
-        column_stats = calculate_column_stats(df)
+            features, label_encoders = preprocess_dynamic_data(
+                df, column_types, converted=converted, encoding=encoding
+            )
+        # Hashed columns are spread over several features
+        model = create_detector(detector, sequence_length, sum(encoded_widths(df.columns, label_encoders)))
+        if fresh is not None:
+            model.scaler = scaler
+            features_scaled, features_cached = cached_features(
+                cache_entry, df, column_types, label_encoders, model.scaler, converted
+            )
+        else:
+            features_scaled = model.scaler.fit_transform(features)
+            if cache_entry is not None:
+                parsed_cache.save_fresh_state(cache_entry, column_types, encoding, label_encoders, model.scaler)
+                parsed_cache.save_features(
+                    cache_entry, preprocessing_fingerprint(column_types, label_encoders, model.scaler),
+                    features_scaled
+                )
+    
+    state = {
+        'key': key,
+        'detector': detector,
+        'model': model,
+        'columns': list(df.columns),
+        'column_types': column_types,
+        'label_encoders': label_encoders,
+        'feature_widths': encoded_widths(df.columns, label_encoders),
+        'source': source,
+        'training': None,
+        'is_new': entry is None,
+        'features_cached': features_cached
+    }
+    return state, features_scaled
+
+def cached_features(cache_entry, df, column_types, label_encoders, scaler, converted=None):
+    """Scale ``df`` with fitted preprocessing, reusing the cached matrix for this content.
+
+    Returns ``(features_scaled, from_cache)``.
+    """
+    fingerprint = None
+    if cache_entry is not None:
+        fingerprint = preprocessing_fingerprint(column_types, label_encoders, scaler)
+        features_scaled = parsed_cache.load_features(cache_entry, fingerprint)
+        if features_scaled is not None:
+            return features_scaled, True
+    features, _ = preprocess_dynamic_data(df, column_types, label_encoders, converted)
+    features_scaled = scaler.transform(features)
+    if fingerprint is not None:
+        parsed_cache.save_features(cache_entry, fingerprint, features_scaled)
+    return features_scaled, False
+
+def transform_features(state, df, converted=None, update_scaler=False):
+    """Preprocess and scale rows with an already resolved model state."""
+    features, _ = preprocess_dynamic_data(
+        df, state['column_types'], state['label_encoders'], converted
+    )
+    if update_scaler:
+        state['model'].scaler.partial_fit(features)
+    return state['model'].scaler.transform(features)
+
+def make_sequences(features_scaled, sequence_length):
+    """Build overlapping LSTM input windows from scaled features.
+
+    The windows are a strided view over one float32 copy of the features,
+    so memory stays proportional to the feature matrix.
+    """
+    return sliding_windows(features_scaled, sequence_length)
+
+def score_sequences(state, sequences, timings=None):
+    """Score windows, training and registering the model first if it is new.
+
+    ``feature_errors`` are returned per column (see ``column_errors``).
+    """
+    timings = timings or StageTimings()
+    model = state['model']
+    if state.get('source') is not None:
+        return column_errors(state, score_sequences_incremental(state, sequences, timings))
+    if not state['is_new']:
+        with timings.stage('score'):
+            return column_errors(state, model.score(sequences))
+    
+    with timings.stage('train'):
+        model.train(sequences, epochs=FULL_TRAIN_EPOCHS, calibrate=False)  # Quick training for demonstration
+    with timings.stage('score'):
+        scored = model.score(sequences, update_threshold=True)
+    model_registry.register(
+        state['key'], model, state['columns'], state['column_types'], state['label_encoders']
+    )
+    state['is_new'] = False
+    state['training'] = 'full'
+    return column_errors(state, scored)
+
+def column_errors(state, scored):
+    """Sum the feature errors of each hashed column into one error for that column."""
+    widths = state['feature_widths']
+    if max(widths, default=1) > 1:
+        offsets = np.cumsum([0] + widths[:-1])
+        scored['feature_errors'] = np.add.reduceat(scored['feature_errors'], offsets, axis=1)
+    return scored
+
+def needs_full_retrain(model, sequences):
+    """Decide whether a per-source model should be retrained from scratch.
+
+    That happens after ``RETRAIN_AFTER_UPDATES`` incremental updates, or
+    when the current model reconstructs a sample of the new windows more
+    than ``RETRAIN_DRIFT_RATIO`` times worse than its training data.
+    """
+    baseline = getattr(model, 'baseline_error', None)
+    if baseline is None:
+        return True
+    if getattr(model, 'updates_since_full_fit', 0) >= RETRAIN_AFTER_UPDATES:
+        return True
+    index = np.linspace(0, len(sequences) - 1, min(len(sequences), DRIFT_SAMPLE_WINDOWS)).astype(np.int64)
+    current = float(np.median(np.mean(model.feature_errors(sequences[index]), axis=1)))
+    return current > RETRAIN_DRIFT_RATIO * max(baseline, 1e-12)
+
+def score_sequences_incremental(state, sequences, timings):
+    """Fine-tune a per-source model on new windows, then score them.
+
+    The threshold is kept online across batches instead of being reset to
+    each batch's 95th percentile; a full retrain restarts it. Later chunks
+    of a streamed file keep fine-tuning the same model without counting as
+    further updates; ``save_source_model`` persists it once at the end.
+    """
+    model = state['model']
+    if state['training'] is not None:
+        with timings.stage('train'):
+            model.partial_fit(sequences, epochs=INCREMENTAL_EPOCHS)
+        with timings.stage('score'):
+            feature_errors = model.feature_errors(sequences)
+            model.update_threshold_online(feature_errors, count_update=False)
+        return model.score_errors(feature_errors)
+
+    full = state['is_new'] or needs_full_retrain(model, sequences)
+    if full:
+        if not state['is_new']:
+            # Start from fresh weights but keep the continuously updated scaler
+            fresh = create_detector(state['detector'], model.sequence_length, model.n_features)
+            fresh.scaler = model.scaler
+            model = state['model'] = fresh
+        with timings.stage('train'):
+            model.train(sequences, epochs=FULL_TRAIN_EPOCHS, calibrate=False)
+        with timings.stage('score'):
+            feature_errors = model.feature_errors(sequences)
+            model.calibrate(feature_errors)
+    else:
+        with timings.stage('train'):
+            model.partial_fit(sequences, epochs=INCREMENTAL_EPOCHS)
+        with timings.stage('score'):
+            feature_errors = model.feature_errors(sequences)
+            model.update_threshold_online(feature_errors)
+    
+    state['is_new'] = False
+    state['training'] = 'full' if full else 'incremental'
+    return model.score_errors(feature_errors)
+
+def save_source_model(state):
+    """Register a per-source model once an analysis has finished updating it."""
+    if state.get('source') is None or state['training'] is None:
+        return
+    model_registry.register(
+        state['key'], state['model'], state['columns'], state['column_types'], state['label_encoders'],
+        source=state['source']
+    )
+
+def build_anomalies(rows, scores, confidence, feature_errors, timestamps=None, times=None):
+    """Describe anomalous windows for the API response.
+
+    ``rows`` holds the context row of each anomaly (already selected with a
+    boolean mask or positions) and the arrays are aligned with it, so the
+    contexts are materialized in one vectorized ``to_dict('records')`` call.
+    ``times`` are the rows' ISO event times (see ``event_times``); they are
+    returned as ``event_time`` and label the anomaly unless ``timestamps``
+    is given.
+    """
+    if len(rows) == 0:
+        return []
+    columns = [str(column) for column in rows.columns]
+    contexts = rows.astype(str).to_dict('records')
+    top_features = np.asarray(columns, dtype=object)[np.argmax(feature_errors, axis=1)]
+    severities = np.where(scores > 0.8, 'High', 'Medium')
+    if timestamps is None:
+        timestamps = timestamp_labels(times, rows.index)
+    if times is None:
+        times = [None] * len(rows)
+    
+    anomalies = []
+    for i, timestamp, event_time, context, score, conf, errors, top_feature, severity in zip(
+        rows.index, timestamps, times, contexts, scores.tolist(), confidence.tolist(),
+        feature_errors.tolist(), top_features, severities
+    ):
+        anomalies.append({
+            'index': int(i),
+            'timestamp': str(timestamp),
+            'event_time': event_time,
+            'anomaly_score': score,
+            'confidence': conf,
+            'context': context,
+            'feature_errors': dict(zip(columns, errors)),
+            'top_feature': top_feature,
+            'description': f'Anomaly detected in log entry {i}',
+            'severity': str(severity),
+            'action': 'Investigate unusual pattern in log entry'
+        })
+    return anomalies
+
+def timestamp_labels(times, index):
+    """Label rows with their event time where known, else their row number."""
+    labels = index.astype(str).to_numpy(dtype=object)
+    if times is not None:
+        known = pd.notna(times)
+        labels[known] = times[known]
+    return labels
+
+def build_recommendations(column_stats, total_anomalies):
+    """Build recommendations based on findings."""
+    recommendations = []
+    if total_anomalies > 0:
+        recommendations.append({
+            'title': 'Anomalies Detected',
+            'description': f'Found {total_anomalies} anomalies in the logs. Review the anomaly details for more information.'
+        })
+    
+    # Add column-specific recommendations
+    for column, stats in column_stats.items():
+        if stats['type'] == 'numeric':
+            if stats['std'] > stats['mean'] * 2:  # High variance
+                recommendations.append({
+                    'title': f'High Variance in {column}',
+                    'description': f'The column {column} shows high variance. Consider investigating unusual patterns.'
+                })
+    return recommendations
+
+def analyze_logs(log_file, streaming=None, chunk_rows=CHUNK_ROWS, source=None, detector=None,
+                 column_types=None, content_hash=None, keep_stats_sketch=False):
+    """Analyze any type of log file.
+
+    Large files (or ``streaming=True``) are analyzed chunk by chunk so memory
+    use stays bounded regardless of file size. ``source`` scopes the cached
+    column schema and the model to one log producer, whose model is then
+    fine-tuned on every upload (see ``score_sequences_incremental``).
+    ``detector`` selects the anomaly detection engine. ``column_types``
+    reuses a schema inferred elsewhere (e.g. once for a batch of files with
+    the same layout) so every such file resolves to the same model.
+    Parsed rows and features are cached per content (``content_hash``, or
+    the file's SHA-256 when not given) so re-analyses skip parsing.
+    With ``keep_stats_sketch`` the mergeable ``ColumnStats`` behind
+    ``column_stats`` is returned as ``column_stats_sketch`` so callers can
+    combine statistics across files. Analyses of the same ``source`` run one
+    at a time, also across worker processes, so none of its updates are lost.
+    """
+    try:
+        # One analysis at a time updates a source's model, across worker processes too
+        with model_registry.source_lock(source):
+            if streaming is None:
+                streaming = should_stream(log_file)
+            if streaming:
+                return analyze_logs_streaming(
+                    log_file, chunk_rows, source, detector, column_types, content_hash, keep_stats_sketch
+                )
         
-        # Preprocess the data
-        features, label_encoders = preprocess_dynamic_data(df)
+            timings = StageTimings()
         
-        # Normalize features
-        scaler = StandardScaler()
-        features_scaled = scaler.fit_transform(features)
+            # Load the data, from the columnar cache when this content was parsed before
+            with timings.stage('parse'):
+                cache_entry = parsed_cache.entry(log_file, content_hash)
+                df = parsed_cache.load_frame(cache_entry)
+                parsed_cached = df is not None
+                if not parsed_cached:
+                    df = load_log_file(log_file)
+            timings.count('parsed_cache_hits', parsed_cached)
+            if not parsed_cached:
+                with timings.stage('parse_cache'):
+                    parsed_cache.save_frame(cache_entry, df)
+
+            # Infer the schema and parse every column exactly once
+            with timings.stage('schema'):
+                column_types = shared_column_types(df, column_types, source)
+                converted = convert_columns(df, column_types)
+                times = event_times(converted, column_types)
+
+            # Calculate basic statistics
+            with timings.stage('column_stats'):
+                stats = ColumnStats().update(df, column_types, converted)
+                column_stats = stats.result()
         
-        # Prepare sequences for LSTM
-        sequence_length = min(10, len(features_scaled) - 1)  # Adjust sequence length based on data size
-        n_features = features_scaled.shape[1]
+            # Look up a trained model for this schema and normalize the data
+            sequence_length = min(SEQUENCE_LENGTH, len(df) - 1)  # Adjust sequence length based on data size
+            with timings.stage('preprocess'):
+                state, features_scaled = resolve_model(
+                    df, sequence_length, column_types, converted, detector, source, cache_entry
+                )
+            model_reused = not state['is_new']
+            timings.count('features_cache_hits', state['features_cached'])
         
-        # Create sequences
-        sequences = []
-        for i in range(len(features_scaled) - sequence_length + 1):
-            sequences.append(features_scaled[i:i + sequence_length])
-        sequences = np.array(sequences)
+            # Create sequences
+            with timings.stage('windowing'):
+                sequences = make_sequences(features_scaled, sequence_length)
         
-        # Convert to tensor
-        sequences = tf.convert_to_tensor(sequences, dtype=tf.float32)
+            # Get predictions, training the model only for schemas we have not seen
+            scored = score_sequences(state, sequences, timings)
+            save_source_model(state)
+            anomaly_scores = scored['scores']
+            anomalies = scored['anomalies']
+            confidence_scores = scored['confidence']
+            feature_errors = scored['feature_errors']
         
-        # Initialize and train the model
-        model = LogAnalysisModel(sequence_length, n_features)
-        model.train(sequences, epochs=5)  # Quick training for demonstration
+            # Calculate total anomalies
+            total_anomalies = int(np.sum(anomalies))
         
-        # Get predictions
-        anomaly_scores = model.get_anomaly_score(sequences)
-        anomalies = model.detect_anomalies(sequences)
-        confidence_scores = model.get_confidence_scores(sequences)
+            with timings.stage('serialize'):
+                # Prepare results
+                results = {
+                    'total_logs': len(df),
+                    'total_anomalies': total_anomalies,
+                    'detector': state['detector'],
+                    'anomaly_scores': anomaly_scores.tolist(),
+                    'confidence_scores': confidence_scores.tolist(),
+                    'column_stats': column_stats,
+                    'anomalies': [],
+                    'timestamps': timestamp_labels(times, df.index).tolist(),
+                    'recommendations': build_recommendations(column_stats, total_anomalies)
+                }
+            
+                # Add detected anomalies with context
+                mask = anomalies == 1
+                results['anomalies'] = build_anomalies(
+                    df.iloc[:len(mask)].loc[mask], anomaly_scores[mask],
+                    confidence_scores[mask], feature_errors[mask],
+                    times=times[:len(mask)][mask] if times is not None else None
+                )
         
-        # Convert to numpy arrays
-        anomaly_scores = anomaly_scores.numpy()
-        anomalies = anomalies.numpy()
-        confidence_scores = confidence_scores.numpy()
+            results['metrics'] = analysis_metrics(
+                timings, log_file, len(df), len(sequences), model_reused, training=state['training']
+            )
+            if keep_stats_sketch:
+                results['column_stats_sketch'] = stats
+            return results
         
-        # Calculate total anomalies
-        total_anomalies = int(np.sum(anomalies))
+    except Exception as e:
+        print(f"Error in log analysis: {str(e)}")
+        raise Exception(f"Failed to analyze logs: {str(e)}")
+
+def analyze_logs_streaming(log_file, chunk_rows=CHUNK_ROWS, source=None, detector=None,
+                           column_types=None, content_hash=None, keep_stats_sketch=False):
+    """Analyze a log file in bounded-size chunks.
+
+    The model is resolved (and, for a new schema, trained) on the first chunk.
+    The last ``sequence_length - 1`` rows of each chunk are carried into the
+    next one so windows spanning a chunk boundary are scored exactly once.
+    Parsed chunks are written to (or read back from) the columnar cache.
+    """
+    timings = StageTimings()
+    state = None
+    model_reused = None
+    stats = ColumnStats()
+    score_parts = []
+    confidence_parts = []
+    anomalies = []
+    labels = []
+    total_logs = 0
+    carry_df = None
+    carry_features = None
+    carry_times = None
+    
+    with timings.stage('parse'):
+        cache_entry = parsed_cache.entry(log_file, content_hash)
+    chunks = parsed_cache.iter_chunks(cache_entry, chunk_rows, iter_log_chunks(log_file, chunk_rows))
+    for chunk in timings.iterate('parse', chunks):
+        if state is None:
+            with timings.stage('schema'):
+                column_types = shared_column_types(chunk, column_types, source)
+                converted = convert_columns(chunk, column_types)
+            sequence_length = min(SEQUENCE_LENGTH, len(chunk) - 1)
+            with timings.stage('preprocess'):
+                state, features_scaled = resolve_model(
+                    chunk, sequence_length, column_types, converted, detector, source
+                )
+            model_reused = not state['is_new']
+            columns = state['columns']
+        else:
+            chunk = chunk.reindex(columns=columns)
+            with timings.stage('schema'):
+                converted = convert_columns(chunk, column_types)
+            with timings.stage('preprocess'):
+                features_scaled = transform_features(
+                    state, chunk, converted, update_scaler=source is not None
+                )
         
-        # Prepare results
+        total_logs += len(chunk)
+        with timings.stage('schema'):
+            times = event_times(converted, column_types)
+            if times is None:
+                times = np.full(len(chunk), None, dtype=object)
+            labels.append(timestamp_labels(times, chunk.index))
+        with timings.stage('column_stats'):
+            stats.update(chunk, column_types, converted)
+        
+        # Prepend the overlap from the previous chunk
+        with timings.stage('windowing'):
+            if carry_df is not None:
+                window_df = pd.concat([carry_df, chunk])
+                features_scaled = np.vstack([carry_features, features_scaled])
+                times = np.concatenate([carry_times, times])
+            else:
+                window_df = chunk
+            split = max(len(window_df) - (sequence_length - 1), 0)
+            carry_df = window_df.iloc[split:]
+            carry_features = features_scaled[split:]
+            carry_times = times[split:]
+            if len(window_df) < sequence_length:
+                continue
+            sequences = make_sequences(features_scaled, sequence_length)
+        
+        scored = score_sequences(state, sequences, timings)
+        score_parts.append(scored['scores'])
+        confidence_parts.append(scored['confidence'])
+        
+        # Window i of this chunk starts at global row window_df.index[i]
+        with timings.stage('serialize'):
+            mask = scored['anomalies'] == 1
+            anomalies.extend(build_anomalies(
+                window_df.iloc[:len(mask)].loc[mask], scored['scores'][mask],
+                scored['confidence'][mask], scored['feature_errors'][mask],
+                times=times[:len(mask)][mask]
+            ))
+    
+    if state is None:
+        raise ValueError("Log file is empty")
+    save_source_model(state)
+    
+    with timings.stage('column_stats'):
+        column_stats = stats.result()
+    anomaly_scores = np.concatenate(score_parts) if score_parts else np.array([], dtype=np.float32)
+    confidence_scores = np.concatenate(confidence_parts) if confidence_parts else np.array([], dtype=np.float32)
+    
+    with timings.stage('serialize'):
         results = {
-            'total_logs': len(df),
-            'total_anomalies': total_anomalies,
+            'total_logs': total_logs,
+            'total_anomalies': len(anomalies),
+            'detector': state['detector'],
             'anomaly_scores': anomaly_scores.tolist(),
             'confidence_scores': confidence_scores.tolist(),
             'column_stats': column_stats,
-            'anomalies': [],
-            'timestamps': df.index.astype(str).tolist(),
-            'recommendations': []
+            'anomalies': anomalies,
+            'timestamps': np.concatenate(labels).tolist() if labels else [],
+            'recommendations': build_recommendations(column_stats, len(anomalies))
         }
-        
-        # Add detected anomalies with context
-        for i, is_anomaly in enumerate(anomalies):
-            if is_anomaly == 1:
-                anomaly_context = {}
-                for column in df.columns:
-                    anomaly_context[column] = str(df.iloc[i][column])
-                
-                results['anomalies'].append({
-                    'index': int(i),
-                    'timestamp': str(df.index[i]),
-                    'anomaly_score': float(anomaly_scores[i]),
-                    'confidence': float(confidence_scores[i]),
-                    'context': anomaly_context,
-                    'description': f'Anomaly detected in log entry {i}',
-                    'severity': 'High' if anomaly_scores[i] > 0.8 else 'Medium',
-                    'action': 'Investigate unusual pattern in log entry'
-                })
-        
-        # Add recommendations based on findings
-        if results['total_anomalies'] > 0:
-            results['recommendations'].append({
-                'title': 'Anomalies Detected',
-                'description': f'Found {total_anomalies} anomalies in the logs. Review the anomaly details for more information.'
-            })
-        
-        # Add column-specific recommendations
-        for column, stats in column_stats.items():
-            if stats['type'] == 'numeric':
-                if stats['std'] > stats['mean'] * 2:  # High variance
-                    results['recommendations'].append({
-                        'title': f'High Variance in {column}',
-                        'description': f'The column {column} shows high variance. Consider investigating unusual patterns.'
-                    })
-        
-        return results
-        
-    except Exception as e:
-        print(f"Error in log analysis: {str(e)}")
-        raise Exception(f"Failed to analyze logs: {str(e)}")
+    results['metrics'] = analysis_metrics(
+        timings, log_file, total_logs, len(anomaly_scores), model_reused, streaming=True,
+        training=state['training']
+    )
+    if keep_stats_sketch:
+        results['column_stats_sketch'] = stats
+    return results
+
+def analysis_metrics(timings, log_file, rows, windows, model_reused, streaming=False, training=None):
+    """Summarize one analysis run for the ``metrics`` block of its result."""
+    timings.count('rows', rows)
+    timings.count('windows', windows)
+    try:
+        timings.count('bytes', os.path.getsize(log_file))
+    except (OSError, TypeError):
+        pass
+    summary = timings.as_dict()
+    summary['model_reused'] = model_reused
+    summary['streaming'] = streaming
+    summary['training'] = training
+    return summary
 
 def save_model(model, filename):
     """Save the trained model."""
@@ -191,6 +598,7 @@ def save_model(model, filename):
 
 def load_model(filename, sequence_length, n_features):
     """Load a saved model."""
+    from models.lstm_autoencoder import LogAnalysisModel
     model_path = os.path.join('saved_models', filename)
     if os.path.exists(model_path):
         return LogAnalysisModel.load_model(model_path, sequence_length, n_features)
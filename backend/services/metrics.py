@@ -0,0 +1,155 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+class StageTimings:
+    """Per-stage wall time and counters for one analysis run.
+
+    Timings of a stage entered more than once (e.g. per chunk) are summed.
+    Only ``perf_counter`` calls happen on the hot path.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counts = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def iterate(self, name, iterable):
+        """Yield from ``iterable``, charging the time spent producing items to ``name``."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def count(self, name, value):
+        self.counts[name] = self.counts.get(name, 0) + int(value)
+
+    def as_dict(self):
+        return {
+            'stages': {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            'total_seconds': round(sum(self.stages.values()), 6),
+            **self.counts
+        }
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+class MetricsRegistry:
+    """Process-wide counters, gauges and histograms rendered in Prometheus text format."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._help = {}
+        self._types = {}
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+
+    def _declare(self, name, kind, help_text):
+        if name not in self._types:
+            self._types[name] = kind
+            self._help[name] = help_text or name
+
+    def inc(self, name, value=1, help_text=None, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._declare(name, 'counter', help_text)
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, help_text=None, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._declare(name, 'histogram', help_text)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0
+                }
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['count'] += 1
+            histogram['sum'] += value
+
+    def gauge(self, name, callback, help_text=None):
+        """Register a gauge whose value is read from ``callback()`` at scrape time."""
+        with self._lock:
+            self._declare(name, 'gauge', help_text)
+            self._gauges[name] = callback
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: dict(value, buckets=list(value['buckets']))
+                          for key, value in self._histograms.items()}
+            gauges = dict(self._gauges)
+            types = dict(self._types)
+            helps = dict(self._help)
+
+        samples = {}
+        for (name, labels), value in counters.items():
+            samples.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), histogram in histograms.items():
+            lines = samples.setdefault(name, [])
+            for bound, count in zip(self.buckets, histogram['buckets']):
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+        for name, callback in gauges.items():
+            try:
+                value = callback()
+            except Exception as e:
+                logger.error(f"Error reading gauge {name}: {str(e)}")
+                continue
+            samples.setdefault(name, []).append(f"{name} {value}")
+
+        output = []
+        for name in sorted(samples):
+            output.append(f"# HELP {name} {helps[name]}")
+            output.append(f"# TYPE {name} {types[name]}")
+            output.extend(samples[name])
+        return '\n'.join(output) + '\n'
+
+metrics = MetricsRegistry()
+
+def record_analysis_metrics(analysis_metrics):
+    """Fold the ``metrics`` block of an analysis result into the process registry.
+
+    Analyses run in worker processes, so their timings travel back with the
+    result and are recorded here by the API process.
+    """
+    if not analysis_metrics or analysis_metrics.get('cached'):
+        return
+    for stage, seconds in analysis_metrics.get('stages', {}).items():
+        metrics.observe('soc_analysis_stage_seconds', seconds,
+                        "Time spent in each analysis stage", stage=stage)
+    metrics.observe('soc_analysis_seconds', analysis_metrics.get('total_seconds', 0.0),
+                    "Total analysis time")
+    metrics.inc('soc_analysis_rows_total', analysis_metrics.get('rows', 0), "Log rows analyzed")
+    metrics.inc('soc_analysis_bytes_total', analysis_metrics.get('bytes', 0), "Log bytes analyzed")
+    metrics.inc('soc_analysis_windows_total', analysis_metrics.get('windows', 0), "Windows scored")
@@ -0,0 +1,240 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+import joblib
+from models.detectors import DEFAULT_DETECTOR, SEQUENCE_LENGTH, load_detector
+from services.encoding import HASH_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.getenv('MODEL_REGISTRY_DIR', 'saved_models')
+
+if os.name == 'nt':
+    import msvcrt
+
+    def _lock_file(handle):
+        handle.seek(0)
+        while True:
+            try:
+                # LK_LOCK gives up after about ten seconds; keep waiting
+                msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+
+    def _unlock_file(handle):
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock_file(handle):
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(handle):
+        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+def schema_key(columns, column_types, sequence_length, n_features, detector='lstm', source=None,
+               encoding='label'):
+    """Build a stable registry key for a log schema and detector engine.
+
+    A ``source`` gives that log producer its own model instead of sharing
+    one with every file of the same layout. Models using another categorical
+    ``encoding`` than plain label encoding are kept apart as well.
+    """
+    schema = {
+        'columns': [str(column) for column in columns],
+        'column_types': {str(column): column_types[column] for column in columns},
+        'sequence_length': int(sequence_length),
+        'n_features': int(n_features),
+        'detector': detector
+    }
+    if source is not None:
+        schema['source'] = str(source)
+    if encoding != 'label':
+        # Hashed columns take HASH_BUCKETS features each, so the width is part of the layout
+        schema['encoding'] = encoding
+        schema['hash_buckets'] = HASH_BUCKETS
+    payload = json.dumps(schema, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()[:32]
+
+class ModelRegistry:
+    """Trained autoencoders and their preprocessing state, keyed by log schema."""
+
+    def __init__(self, model_dir=MODEL_DIR):
+        self.model_dir = model_dir
+        self._entries = {}
+        self._metadata_cache = {}
+        self._lock = threading.Lock()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.model_dir, key)
+
+    def _version(self, key):
+        """Modification time of an entry's saved metadata, None when not on disk."""
+        try:
+            return os.stat(os.path.join(self._entry_dir(key), 'schema.joblib')).st_mtime_ns
+        except OSError:
+            return None
+
+    def get(self, key):
+        """Return the registered entry for a schema key, loading it from disk if needed.
+
+        An entry saved again since it was loaded (e.g. by another worker
+        process) is reloaded.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            version = self._version(key)
+            if entry is not None and (version is None or version == entry.get('version')):
+                return entry
+            loaded = self.load(key)
+            if loaded is None:
+                return entry
+            self._entries[key] = loaded
+            return loaded
+
+    def load(self, key):
+        """Load an entry from disk as a private copy, without caching it."""
+        entry_dir = self._entry_dir(key)
+        meta_path = os.path.join(entry_dir, 'schema.joblib')
+        version = self._version(key)
+        if version is None:
+            return None
+
+        try:
+            meta = joblib.load(meta_path)
+            model = load_detector(entry_dir, meta['sequence_length'], meta['n_features'])
+        except Exception as e:
+            logger.error(f"Error loading registered model {key}: {str(e)}")
+            return None
+
+        return {
+            'model': model,
+            'detector': meta.get('detector', 'lstm'),
+            'columns': meta['columns'],
+            'column_types': meta['column_types'],
+            'label_encoders': meta['label_encoders'],
+            'version': version
+        }
+
+    def register(self, key, model, columns, column_types, label_encoders, source=None):
+        """Store a trained model and its preprocessing state under a schema key.
+
+        ``source`` marks a model that belongs to one log producer.
+        """
+        entry = {
+            'model': model,
+            'detector': model.name,
+            'columns': list(columns),
+            'column_types': dict(column_types),
+            'label_encoders': label_encoders
+        }
+
+        # Write to a temporary directory first so readers never see a partial entry
+        entry_dir = self._entry_dir(key)
+        tmp_dir = f"{entry_dir}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            model.save_model(tmp_dir)
+            joblib.dump({
+                'columns': entry['columns'],
+                'column_types': entry['column_types'],
+                'label_encoders': label_encoders,
+                'detector': model.name,
+                'sequence_length': model.sequence_length,
+                'n_features': model.n_features,
+                'source': source
+            }, os.path.join(tmp_dir, 'schema.joblib'))
+            if os.path.exists(entry_dir):
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+        except Exception as e:
+            logger.error(f"Error saving registered model {key}: {str(e)}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        entry['version'] = self._version(key)
+
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    @contextmanager
+    def source_lock(self, source):
+        """Hold an exclusive lock on a log source, shared by all processes using this registry."""
+        if source is None:
+            yield
+            return
+        os.makedirs(self.model_dir, exist_ok=True)
+        name = hashlib.sha256(str(source).encode('utf-8')).hexdigest()[:32]
+        with open(os.path.join(self.model_dir, f".{name}.lock"), 'a+b') as handle:
+            _lock_file(handle)
+            try:
+                yield
+            finally:
+                _unlock_file(handle)
+
+    def _metadata(self, key):
+        """Saved metadata of an entry, read without loading its model."""
+        version = self._version(key)
+        if version is None:
+            return None
+        with self._lock:
+            cached = self._metadata_cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        try:
+            metadata = joblib.load(os.path.join(self._entry_dir(key), 'schema.joblib'))
+        except Exception as e:
+            logger.error(f"Error reading registered model {key}: {str(e)}")
+            return None
+        with self._lock:
+            self._metadata_cache[key] = (version, metadata)
+        return metadata
+
+    def find(self, columns, column_types):
+        """Return ``(key, entry)`` for a shared model trained on this column layout.
+
+        Only metadata is compared; the chosen model alone is loaded. Models
+        of one source are never shared. The ``DEFAULT_DETECTOR`` engine with
+        full-length windows is preferred, and among equals the newest.
+        """
+        columns = [str(column) for column in columns]
+        column_types = {str(k): v for k, v in column_types.items()}
+        candidates = []
+        for key in self.keys():
+            metadata = self._metadata(key)
+            if metadata is None or metadata.get('source') is not None:
+                continue
+            if [str(column) for column in metadata['columns']] != columns:
+                continue
+            if {str(k): v for k, v in metadata['column_types'].items()} != column_types:
+                continue
+            candidates.append((
+                metadata.get('detector', 'lstm') == DEFAULT_DETECTOR,
+                metadata['sequence_length'] == SEQUENCE_LENGTH,
+                self._version(key) or 0,
+                key
+            ))
+        for *_, key in sorted(candidates, reverse=True):
+            entry = self.get(key)
+            if entry is not None:
+                return key, entry
+        return None, None
+
+    def preload(self):
+        """Load every registered model into memory and return how many loaded."""
+        return sum(1 for key in self.keys() if self.get(key) is not None)
+
+    def keys(self):
+        """List schema keys available in memory or on disk."""
+        keys = set(self._entries)
+        if os.path.isdir(self.model_dir):
+            for name in os.listdir(self.model_dir):
+                if os.path.exists(os.path.join(self.model_dir, name, 'schema.joblib')):
+                    keys.add(name)
+        return sorted(keys)
+
+model_registry = ModelRegistry()
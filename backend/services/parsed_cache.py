@@ -0,0 +1,225 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import joblib
+import numpy as np
+import pandas as pd
+from services.encoding import encoder_fingerprint
+from services.ingest import PARSER_VERSION
+from services.storage import UPLOAD_DIR, UPLOAD_CHUNK_BYTES
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; without it only feature matrices are cached
+    pa = pq = None
+
+PARSED_CACHE_ENABLED = os.getenv('PARSED_CACHE', 'true').lower() in ('1', 'true', 'yes')
+
+def file_digest(path):
+    """SHA-256 of a file's content, read in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def types_key(column_types):
+    """Identify an ordered column schema."""
+    payload = json.dumps([[str(column), kind] for column, kind in column_types.items()])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+def preprocessing_fingerprint(column_types, label_encoders, scaler):
+    """Identify the exact mapping from parsed rows to scaled features.
+
+    Covers the schema, every categorical encoder's mapping and the scaler's
+    statistics, so a refit or incrementally updated scaler never reuses
+    stale features.
+    """
+    digest = hashlib.sha256(types_key(column_types).encode('utf-8'))
+    for column in sorted(label_encoders, key=str):
+        digest.update(str(column).encode('utf-8'))
+        digest.update(encoder_fingerprint(label_encoders[column]).encode('utf-8'))
+    for name in ('mean_', 'scale_'):
+        values = getattr(scaler, name, None)
+        if values is not None:
+            digest.update(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+    return digest.hexdigest()[:32]
+
+class ParsedCache:
+    """Parsed log frames and preprocessed features on disk, keyed by content.
+
+    Each analyzed file gets a directory under
+    ``<root>/<hash[:2]>/<hash>-p<PARSER_VERSION>-<kind>`` holding:
+
+    - ``frame.parquet``: the parsed DataFrame (needs pyarrow), read back
+      memory-mapped instead of re-running ``read_csv`` or the line parser
+    - ``fresh-<types>-<encoding>.joblib``: encoders and scaler fitted from
+      scratch on this content, so a new model (another detector or
+      sequence length) skips preprocessing entirely
+    - ``features-<fingerprint>.npy``: the scaled float32 feature matrix,
+      loaded with ``mmap_mode='r'``
+    """
+
+    def __init__(self, root=os.path.join(UPLOAD_DIR, 'parsed'), enabled=PARSED_CACHE_ENABLED):
+        self.root = root
+        self.enabled = enabled
+
+    def entry(self, log_file, content_hash=None):
+        """Return the cache directory for a log file, or None when caching is off."""
+        if not self.enabled:
+            return None
+        try:
+            content_hash = content_hash or file_digest(log_file)
+        except OSError as e:
+            logger.error(f"Error hashing {log_file} for the parsed cache: {str(e)}")
+            return None
+        # CSV and text files go through different parsers
+        kind = 'csv' if log_file.endswith('.csv') else 'text'
+        return os.path.join(self.root, content_hash[:2], f"{content_hash}-p{PARSER_VERSION}-{kind}")
+
+    def load_frame(self, entry):
+        path = self._frame_path(entry)
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            return pd.read_parquet(path, memory_map=True)
+        except Exception as e:
+            logger.error(f"Error reading cached frame {path}: {str(e)}")
+            return None
+
+    def save_frame(self, entry, df):
+        path = self._frame_path(entry)
+        if path is None:
+            return
+        try:
+            self._write(path, lambda tmp_path: df.to_parquet(tmp_path, index=False))
+        except Exception as e:
+            logger.error(f"Error caching parsed frame: {str(e)}")
+
+    def iter_chunks(self, entry, chunk_rows, parse_chunks):
+        """Yield a file's chunks from the cached frame, or parse and cache them.
+
+        ``parse_chunks`` is the uncached chunk iterator. While it runs every
+        chunk is appended to one Parquet file; if a chunk's columns or types
+        do not fit the first chunk's schema, caching is abandoned and the
+        chunks are still yielded.
+        """
+        path = self._frame_path(entry)
+        if path is not None and os.path.exists(path):
+            offset = 0
+            for batch in pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=chunk_rows):
+                chunk = batch.to_pandas()
+                chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+                offset += len(chunk)
+                yield chunk
+            return
+
+        writer = None
+        tmp_path = None
+        caching = path is not None
+        try:
+            for chunk in parse_chunks:
+                if caching:
+                    try:
+                        if writer is None:
+                            os.makedirs(entry, exist_ok=True)
+                            fd, tmp_path = tempfile.mkstemp(dir=entry, suffix='.tmp')
+                            os.close(fd)
+                            table = pa.Table.from_pandas(chunk, preserve_index=False)
+                            writer = pq.ParquetWriter(tmp_path, table.schema)
+                        else:
+                            table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+                        writer.write_table(table)
+                    except Exception as e:
+                        logger.error(f"Error caching parsed chunk, not caching this file: {str(e)}")
+                        caching = False
+                yield chunk
+            if caching and writer is not None:
+                writer.close()
+                writer = None
+                os.replace(tmp_path, path)
+                tmp_path = None
+        finally:
+            if writer is not None:
+                writer.close()
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def load_fresh_state(self, entry, column_types, encoding):
+        """Return ``(label_encoders, scaler)`` fitted from scratch on this content, if cached."""
+        path = self._path(entry, self._fresh_name(column_types, encoding))
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            state = joblib.load(path)
+            return state['label_encoders'], state['scaler']
+        except Exception as e:
+            logger.error(f"Error reading cached preprocessing state {path}: {str(e)}")
+            return None
+
+    def save_fresh_state(self, entry, column_types, encoding, label_encoders, scaler):
+        path = self._path(entry, self._fresh_name(column_types, encoding))
+        if path is None:
+            return
+        state = {'label_encoders': label_encoders, 'scaler': scaler}
+        try:
+            self._write(path, lambda tmp_path: joblib.dump(state, tmp_path))
+        except Exception as e:
+            logger.error(f"Error caching preprocessing state: {str(e)}")
+
+    def load_features(self, entry, fingerprint):
+        """Return the cached scaled features as a read-only memory map, if present."""
+        path = self._path(entry, f"features-{fingerprint}.npy")
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            return np.load(path, mmap_mode='r')
+        except (OSError, ValueError) as e:
+            logger.error(f"Error reading cached features {path}: {str(e)}")
+            return None
+
+    def save_features(self, entry, fingerprint, features):
+        path = self._path(entry, f"features-{fingerprint}.npy")
+        if path is None:
+            return
+        try:
+            # np.save appends .npy to names without it, so write through a file object
+            def write(tmp_path):
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, np.ascontiguousarray(features, dtype=np.float32))
+            self._write(path, write)
+        except OSError as e:
+            logger.error(f"Error caching features: {str(e)}")
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _fresh_name(self, column_types, encoding):
+        return f"fresh-{types_key(column_types)}-{encoding}.joblib"
+
+    def _frame_path(self, entry):
+        return self._path(entry, 'frame.parquet') if pq is not None else None
+
+    def _path(self, entry, name):
+        return None if entry is None else os.path.join(entry, name)
+
+    def _write(self, path, write):
+        """Write via a temporary file and rename so readers never see partial files."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        os.close(fd)
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+parsed_cache = ParsedCache()
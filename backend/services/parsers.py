@@ -0,0 +1,92 @@
+import re
+import pandas as pd
+
+# Number of lines inspected when auto-detecting a log format
+DETECTION_SAMPLE_LINES = 1000
+# Fraction of sampled lines a template must match to be selected
+MIN_MATCH_RATIO = 0.8
+
+class LineTemplate:
+    """A precompiled regular expression describing one log line format.
+
+    Named groups become columns; ``dtypes`` maps a column to ``'float'``,
+    ``'int'`` or ``'datetime'`` (other columns stay strings).
+    """
+
+    def __init__(self, name, pattern, dtypes=None, datetime_format=None):
+        self.name = name
+        self.regex = re.compile(pattern)
+        self.dtypes = dtypes or {}
+        self.datetime_format = datetime_format
+
+    @property
+    def columns(self):
+        return list(self.regex.groupindex)
+
+    def match_ratio(self, lines):
+        """Fraction of ``lines`` (a string Series) matched by this template."""
+        if len(lines) == 0:
+            return 0.0
+        return float(lines.str.match(self.regex).mean())
+
+    def extract(self, lines):
+        """Extract typed columns from a string Series.
+
+        Returns ``(df, matched)`` where ``df`` holds the typed rows for the
+        lines the template matched and ``matched`` is a boolean mask.
+        """
+        extracted = lines.str.extract(self.regex)
+        matched = extracted.notna().all(axis=1)
+        df = extracted[matched].copy()
+        for column, dtype in self.dtypes.items():
+            if dtype == 'datetime':
+                df[column] = pd.to_datetime(df[column], format=self.datetime_format, errors='coerce')
+            elif dtype in ('float', 'int'):
+                df[column] = pd.to_numeric(df[column], errors='coerce')
+        return df, matched
+
+# Registered templates in priority order; more specific formats come first
+TEMPLATES = []
+
+def register_template(template):
+    """Add a line template to the registry."""
+    TEMPLATES.append(template)
+    return template
+
+def get_template(name):
+    """Look up a registered template by name."""
+    for template in TEMPLATES:
+        if template.name == name:
+            return template
+    return None
+
+def detect_template(lines, min_ratio=MIN_MATCH_RATIO):
+    """Return the first registered template matching enough sampled lines."""
+    sample = pd.Series(list(lines[:DETECTION_SAMPLE_LINES]), dtype=object).str.rstrip('\r\n')
+    sample = sample[sample.str.len() > 0]
+    for template in TEMPLATES:
+        if template.match_ratio(sample) >= min_ratio:
+            return template
+    return None
+
+_TIMESTAMP = r'(?P<timestamp>\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:\.\d+)?)'
+
+# <timestamp> [LEVEL] CPU: x%, MEM: y%, REQ: n, ERR: e
+register_template(LineTemplate(
+    'system_metrics',
+    r'^\s*' + _TIMESTAMP + r'\s+\[(?P<level>\w+)\]\s+'
+    r'CPU:\s*(?P<CPU>-?\d+(?:\.\d+)?)%,\s*'
+    r'MEM:\s*(?P<MEM>-?\d+(?:\.\d+)?)%,\s*'
+    r'REQ:\s*(?P<REQ>\d+),\s*'
+    r'ERR:\s*(?P<ERR>-?\d+(?:\.\d+)?)\s*$',
+    dtypes={'timestamp': 'datetime', 'CPU': 'float', 'MEM': 'float', 'REQ': 'int', 'ERR': 'float'},
+    datetime_format='ISO8601'
+))
+
+# <timestamp> [LEVEL] free-form message
+register_template(LineTemplate(
+    'leveled_message',
+    r'^\s*' + _TIMESTAMP + r'\s+\[(?P<level>\w+)\]\s+(?P<message>.*?)\s*$',
+    dtypes={'timestamp': 'datetime'},
+    datetime_format='ISO8601'
+))
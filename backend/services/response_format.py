@@ -0,0 +1,202 @@
+import base64
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; only the "msgpack" format needs it
+    msgpack = None
+
+RESPONSE_FORMATS = ('full', 'compact', 'msgpack')
+SEVERITY_RANK = {'low': 0, 'medium': 1, 'high': 2, 'critical': 3}
+SERIES_FIELDS = ('anomaly_scores', 'confidence_scores')
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+
+def filter_anomalies(results, min_severity=None, offset=0, limit=None):
+    """Return a copy of ``results`` with the anomaly list filtered and paginated.
+
+    ``anomaly_page`` describes the slice so clients can request the next page.
+    """
+    anomalies = results.get('anomalies', [])
+    if min_severity:
+        floor = SEVERITY_RANK.get(min_severity.lower())
+        if floor is None:
+            raise ValueError(f"Unknown severity '{min_severity}'")
+        anomalies = [
+            anomaly for anomaly in anomalies
+            if SEVERITY_RANK.get(str(anomaly.get('severity', '')).lower(), 0) >= floor
+        ]
+
+    total = len(anomalies)
+    end = total if limit is None else offset + limit
+    page = anomalies[offset:end]
+
+    filtered = dict(results)
+    filtered['anomalies'] = page
+    filtered['anomaly_page'] = {
+        'offset': offset,
+        'limit': limit,
+        'total': total,
+        'returned': len(page)
+    }
+    return filtered
+
+def lttb(y, n_out):
+    """Pick ``n_out`` positions of ``y`` with Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept; every bucket in between
+    contributes the point forming the largest triangle with the previously
+    picked point and the mean of the next bucket, which preserves peaks.
+    """
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])[:max(n_out, 1)]
+    x = np.arange(n, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        next_lo, next_hi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        next_x = x[next_lo:max(next_hi, next_lo + 1)].mean()
+        next_y = y[next_lo:max(next_hi, next_lo + 1)].mean()
+        area = np.abs((x[a] - next_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return np.unique(selected)
+
+def minmax_buckets(y, n_out):
+    """Pick the minimum and maximum of ``n_out // 2`` equal buckets of ``y``."""
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    edges = np.linspace(0, n, max(n_out // 2, 1) + 1).astype(np.int64)
+    picks = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi > lo:
+            picks.extend((lo + int(np.argmin(y[lo:hi])), lo + int(np.argmax(y[lo:hi]))))
+    return np.unique(picks)
+
+def _range_bound(value):
+    """A zoom bound is a window number when it is an integer, else a UTC time."""
+    try:
+        return int(value), False
+    except ValueError:
+        import pandas as pd
+
+        bound = pd.to_datetime(value, utc=True, errors='coerce')
+        if pd.isna(bound):
+            raise ValueError(f"Invalid range bound '{value}': use a window number or an ISO-8601 time")
+        return np.datetime64(bound.tz_convert(None), 'ms'), True
+
+def _label_times(labels):
+    """Parse ``timestamps`` labels; row-number labels (no event time) become NaT."""
+    import pandas as pd
+
+    labels = pd.Series(labels, dtype=object)
+    # Event times are always written as ISO-8601 UTC with a trailing Z
+    is_time = labels.str.endswith('Z', na=False).to_numpy()
+    times = np.full(len(labels), np.datetime64('NaT'), dtype='datetime64[ms]')
+    try:
+        times[is_time] = labels[is_time].str[:-1].to_numpy().astype('datetime64[ms]')
+    except ValueError:
+        parsed = pd.to_datetime(labels[is_time], utc=True, errors='coerce', format='ISO8601')
+        times[is_time] = parsed.dt.tz_convert(None).to_numpy(dtype='datetime64[ms]')
+    return times
+
+def series_range(labels, start=None, end=None):
+    """Positions of the windows between ``start`` and ``end`` (inclusive)."""
+    positions = np.arange(len(labels))
+    mask = np.ones(len(labels), dtype=bool)
+    times = None
+    for value, is_start in ((start, True), (end, False)):
+        if value is None:
+            continue
+        bound, is_time = _range_bound(value)
+        if is_time:
+            if times is None:
+                times = _label_times(labels)
+                # Windows without an event time never fall in a time range
+                mask &= ~np.isnat(times)
+            keys = times
+        else:
+            keys = positions
+        mask &= keys >= bound if is_start else keys <= bound
+    return positions[mask]
+
+def downsample_series(results, max_points=None, start=None, end=None, method='lttb'):
+    """Return a copy of ``results`` with per-window series zoomed and downsampled.
+
+    The series are cut to the windows between ``start`` and ``end`` (window
+    numbers or event times) and reduced to about ``max_points`` points with
+    LTTB or min/max bucketing. Windows flagged as anomalies are always kept,
+    so the budget can be exceeded by their count. ``timestamps`` is aligned
+    with the returned points and ``series_index`` gives their window numbers.
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unknown downsampling method '{method}'. Use one of: {', '.join(DOWNSAMPLE_METHODS)}")
+    scores = np.asarray(results.get('anomaly_scores', []), dtype=np.float64)
+    n = len(scores)
+    labels = np.asarray(list(results.get('timestamps', []))[:n], dtype=object)
+    if len(labels) < n:
+        labels = np.concatenate([labels, np.arange(len(labels), n).astype(str).astype(object)])
+    positions = series_range(labels, start, end)
+
+    if max_points is not None and len(positions) > max_points:
+        flagged = np.array([anomaly['index'] for anomaly in results.get('anomalies', [])], dtype=np.int64)
+        flagged = positions[np.isin(positions, flagged)]
+        budget = max(max_points - len(flagged), 2)
+        pick = lttb if method == 'lttb' else minmax_buckets
+        positions = np.union1d(positions[pick(scores[positions], budget)], flagged)
+
+    sampled = dict(results)
+    for field in SERIES_FIELDS:
+        if field in results:
+            sampled[field] = np.asarray(results[field])[positions].tolist()
+    sampled['timestamps'] = labels[positions].tolist()
+    sampled['series_index'] = positions.tolist()
+    sampled['series'] = {
+        'method': method if max_points is not None else None,
+        'total_points': n,
+        'returned': len(positions),
+        'start': start,
+        'end': end
+    }
+    return sampled
+
+def _is_row_index(timestamps):
+    """True when timestamps are just the row numbers 0..n-1."""
+    return all(value == str(i) for i, value in enumerate(timestamps))
+
+def compact_results(results, binary=False):
+    """Convert per-window series to columnar float32 arrays.
+
+    With ``binary=False`` arrays are base64 encoded so they fit in JSON;
+    with ``binary=True`` raw bytes are kept for msgpack.
+    """
+    compact = dict(results)
+    for field in SERIES_FIELDS:
+        if field not in results:
+            continue
+        values = np.asarray(results[field], dtype='<f4')
+        data = values.tobytes()
+        compact[field] = {
+            'dtype': 'float32',
+            'length': len(values),
+            'encoding': 'raw' if binary else 'base64',
+            'data': data if binary else base64.b64encode(data).decode('ascii')
+        }
+
+    timestamps = results.get('timestamps')
+    if timestamps is not None and _is_row_index(timestamps):
+        compact['timestamps'] = {'encoding': 'range', 'start': 0, 'length': len(timestamps)}
+    compact['format'] = 'compact'
+    return compact
+
+def pack_results(results):
+    """Serialize compact results with msgpack."""
+    if msgpack is None:
+        raise RuntimeError("msgpack is not installed")
+    return msgpack.packb(compact_results(results, binary=True), default=str)
@@ -0,0 +1,152 @@
+import os
+import threading
+import warnings
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# Rows inspected per column when inferring its type
+SCHEMA_SAMPLE_ROWS = int(os.getenv('SCHEMA_SAMPLE_ROWS', 1000))
+# Rows re-checked per column before reusing a cached schema
+SCHEMA_VALIDATE_ROWS = 32
+SCHEMA_CACHE_SIZE = 128
+
+_schema_cache = OrderedDict()
+_schema_cache_lock = threading.Lock()
+
+def is_numeric_column(series):
+    """Check if a column contains numeric data."""
+    try:
+        pd.to_numeric(series, errors='raise')
+        return True
+    except (ValueError, TypeError):
+        return False
+
+def is_timestamp_column(series):
+    """Check if a column contains timestamp data."""
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning)
+            pd.to_datetime(series, errors='raise')
+        return True
+    except (ValueError, TypeError, OverflowError):
+        return False
+
+def sample_column(series, sample_size=SCHEMA_SAMPLE_ROWS):
+    """Return a bounded, evenly spread sample of the non-null values of a column."""
+    values = series.dropna()
+    if len(values) <= sample_size:
+        return values
+    positions = np.linspace(0, len(values) - 1, sample_size).astype(np.int64)
+    return values.iloc[positions]
+
+def infer_column_type(series, sample_size=SCHEMA_SAMPLE_ROWS):
+    """Classify a column as numeric, timestamp or categorical from a sample."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return 'timestamp'
+    if pd.api.types.is_numeric_dtype(series):
+        return 'numeric'
+    sample = sample_column(series, sample_size)
+    if is_numeric_column(sample):
+        return 'numeric'
+    if is_timestamp_column(sample):
+        return 'timestamp'
+    return 'categorical'
+
+def cached_types_hold(df, column_types, sample_size=SCHEMA_VALIDATE_ROWS):
+    """Check cached numeric and timestamp types against a small sample of ``df``.
+
+    Categorical is the fallback type and always holds.
+    """
+    for column, kind in column_types.items():
+        series = df[column]
+        if kind == 'numeric' and not pd.api.types.is_numeric_dtype(series):
+            if not is_numeric_column(sample_column(series, sample_size)):
+                return False
+        elif kind == 'timestamp' and not pd.api.types.is_datetime64_any_dtype(series):
+            if not is_timestamp_column(sample_column(series, sample_size)):
+                return False
+    return True
+
+def infer_column_types(df, source=None, sample_size=SCHEMA_SAMPLE_ROWS):
+    """Classify each column as numeric, timestamp or categorical.
+
+    Types are inferred from a bounded sample per column. For a ``source``
+    they are cached per ``(source, columns, dtypes)`` so repeated uploads
+    from that producer only re-check a small sample; uploads without one
+    are always inferred, since unrelated files can share a header.
+    """
+    cache_key = (source, tuple(map(str, df.columns)), tuple(map(str, df.dtypes)))
+    if source is not None:
+        with _schema_cache_lock:
+            cached = _schema_cache.get(cache_key)
+            if cached is not None:
+                _schema_cache.move_to_end(cache_key)
+        if cached is not None and cached_types_hold(df, cached):
+            return dict(cached)
+
+    column_types = {
+        column: infer_column_type(df[column], sample_size)
+        for column in df.columns
+    }
+    if source is None:
+        return column_types
+
+    with _schema_cache_lock:
+        _schema_cache[cache_key] = column_types
+        while len(_schema_cache) > SCHEMA_CACHE_SIZE:
+            _schema_cache.popitem(last=False)
+    return dict(column_types)
+
+def convert_columns(df, column_types):
+    """Convert every column once according to its inferred type.
+
+    Numeric columns become float Series (NaN where unparseable), timestamp
+    columns become datetime Series (NaT where unparseable) and categorical
+    columns become strings with missing values replaced by ``'UNKNOWN'``.
+    """
+    converted = {}
+    for column in df.columns:
+        column_type = column_types[column]
+        if column_type == 'numeric':
+            converted[column] = pd.to_numeric(df[column], errors='coerce')
+        elif column_type == 'timestamp':
+            if pd.api.types.is_datetime64_any_dtype(df[column]):
+                converted[column] = df[column]
+            else:
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', UserWarning)
+                    converted[column] = pd.to_datetime(df[column], errors='coerce')
+        else:
+            converted[column] = df[column].fillna('UNKNOWN').astype(str)
+    return converted
+
+def timestamps_to_seconds(timestamps):
+    """Convert a datetime Series to unix seconds regardless of its resolution.
+
+    Unparseable timestamps (NaT) map to 0.
+    """
+    if timestamps.dt.tz is not None:
+        timestamps = timestamps.dt.tz_convert(None)
+    timestamps = timestamps.astype('datetime64[ns]').fillna(pd.Timestamp(0))
+    return timestamps.astype('int64') // 10**9
+
+def event_times(converted, column_types):
+    """ISO-8601 UTC event time of every row, from the first timestamp column.
+
+    Naive timestamps are taken as UTC and unparseable ones become None.
+    Returns None when the log has no timestamp column.
+    """
+    column = next((column for column, kind in column_types.items() if kind == 'timestamp'), None)
+    if column is None:
+        return None
+    timestamps = converted[column]
+    if timestamps.dt.tz is not None:
+        timestamps = timestamps.dt.tz_convert(None)
+    values = timestamps.to_numpy(dtype='datetime64[ns]')
+    missing = np.isnat(values)
+    # Only show milliseconds when the log records sub-second times
+    subsecond = bool(np.any(values.view(np.int64)[~missing] % 10**9))
+    times = np.datetime_as_string(values, unit='ms' if subsecond else 's', timezone='UTC').astype(object)
+    times[missing] = None
+    return times
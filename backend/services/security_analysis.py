@@ -0,0 +1,348 @@
+import asyncio
+import json
+import logging
+import os
+import re
+from services.llm_gateway import anomaly_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of anomaly groups analyzed concurrently per batch request
+SECURITY_BATCH_MAX_PARALLEL = int(os.getenv('SECURITY_BATCH_MAX_PARALLEL', 4))
+# Most anomalies analyzed together in one prompt
+SECURITY_GROUP_MAX_ANOMALIES = int(os.getenv('SECURITY_GROUP_MAX_ANOMALIES', 10))
+
+SECTION_NAMES = ['THREAT ASSESSMENT', 'IMPACT ANALYSIS', 'MITIGATION COMMANDS', 'PREVENTION MEASURES']
+COMMAND_GROUPS = ['Immediate Actions:', 'System Hardening:', 'Monitoring Setup:']
+# Marks where each anomaly's analysis starts in a multi-anomaly answer
+_ANOMALY_HEADER = re.compile(r'^[ \t]*=+[ \t]*ANOMALY[ \t]+(\d+)[ \t]*=+[ \t]*$', re.MULTILINE | re.IGNORECASE)
+
+SAFETY_SETTINGS = {
+    "HARM_CATEGORY_DANGEROUS_CONTENT": "BLOCK_NONE",
+    "HARM_CATEGORY_HATE_SPEECH": "BLOCK_NONE",
+    "HARM_CATEGORY_HARASSMENT": "BLOCK_NONE",
+    "HARM_CATEGORY_SEXUALLY_EXPLICIT": "BLOCK_NONE"
+}
+
+ANALYSIS_FORMAT = """
+    THREAT ASSESSMENT
+    [Brief overview of the security threat]
+
+    IMPACT ANALYSIS
+    Risk Level: [Critical/High/Medium/Low]
+    Affected Components: [List components]
+    Potential Consequences: [List consequences]
+
+    MITIGATION COMMANDS
+
+    Immediate Actions:
+    COMMAND: [Windows command]
+    DESCRIPTION: [What this command does]
+
+    System Hardening:
+    COMMAND: [Windows command]
+    DESCRIPTION: [What this command does]
+
+    Monitoring Setup:
+    COMMAND: [Windows command]
+    DESCRIPTION: [What this command does]
+
+    PREVENTION MEASURES
+    [1] [First measure]
+    [2] [Second measure]
+    [3] [Third measure]
+"""
+
+def build_security_prompt(request):
+    """Create a security-focused prompt for Gemini."""
+    return f"""
+    Based on this system log anomaly, provide specific Windows commands to address and mitigate the security issues.
+
+    Input Data:
+    Context: {request.context}
+    Score: {request.score}
+    Confidence: {request.confidence}
+    Severity: {request.severity}
+
+    Please provide your analysis in this exact format:
+{ANALYSIS_FORMAT}
+    Note: Provide only Windows-compatible commands that directly address the detected anomaly.
+    Include specific parameters and values, not placeholders.
+    """
+
+def _context_value(context, key):
+    if isinstance(context, str):
+        try:
+            context = json.loads(context)
+        except ValueError:
+            return 'N/A'
+    if isinstance(context, dict):
+        return context.get(key, 'N/A')
+    return 'N/A'
+
+def default_security_analysis(request):
+    """Default analysis used when Gemini returns no content."""
+    return {
+        "analysis": f"""
+THREAT ASSESSMENT
+High CPU ({_context_value(request.context, 'CPU')}) and memory ({_context_value(request.context, 'MEM')}) utilization detected.
+
+IMPACT ANALYSIS
+Risk Level: {request.severity}
+Affected Components: CPU, Memory, System Resources
+Potential Consequences: System performance degradation, potential service disruption
+
+PREVENTION MEASURES
+1. Monitor and terminate resource-intensive processes
+2. Update system security patches
+3. Review system logs for suspicious activities
+""".strip(),
+        "commands": [
+            {
+                "command": "tasklist /v",
+                "description": "[Immediate Actions] Lists all running processes with their resource usage"
+            },
+            {
+                "command": "wmic process where 'PercentProcessorTime > 50' get Caption,ProcessId,PercentProcessorTime",
+                "description": "[Monitoring] Shows processes using more than 50% CPU"
+            },
+            {
+                "command": "Get-EventLog -LogName System -EntryType Error -Newest 10",
+                "description": "[Analysis] Retrieves recent system error logs for investigation"
+            }
+        ]
+    }
+
+def error_security_analysis(request):
+    """Simplified analysis returned when the security analysis fails."""
+    return {
+        "analysis": f"""
+THREAT ASSESSMENT
+Detected anomaly in system metrics.
+
+IMPACT ANALYSIS
+Risk Level: {request.severity}
+Affected Components: System Resources
+Potential Consequences: Performance impact
+
+PREVENTION MEASURES
+1. Monitor system resources
+2. Review security logs
+3. Update system security
+""".strip(),
+        "commands": [
+            {
+                "command": "tasklist /v",
+                "description": "[Basic Analysis] Lists all running processes"
+            }
+        ]
+    }
+
+def parse_security_analysis(analysis):
+    """Parse a structured Gemini response into formatted analysis and commands."""
+    sections = {}
+    current_section = None
+    current_command = None
+    commands = []
+
+    for line in analysis.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+
+        # Handle main sections
+        if line in SECTION_NAMES:
+            current_section = line
+            sections[current_section] = []
+            continue
+
+        # Handle command sections
+        if line.endswith(':') and line in COMMAND_GROUPS:
+            current_command = line[:-1]
+            continue
+
+        if current_command and line.startswith('COMMAND:'):
+            cmd = line.replace('COMMAND:', '').strip()
+            continue
+
+        if current_command and line.startswith('DESCRIPTION:'):
+            desc = line.replace('DESCRIPTION:', '').strip()
+            commands.append({
+                'command': cmd,
+                'description': f'[{current_command}] {desc}'
+            })
+            current_command = None
+            continue
+
+        # Skip any preamble before the first section
+        if current_section is None:
+            continue
+
+        # Format prevention measures as a list
+        if current_section == 'PREVENTION MEASURES' and line.startswith('['):
+            # Keep the square brackets format from the input
+            sections[current_section].append(line)
+        else:
+            sections[current_section].append(line)
+
+    # Format the analysis in a clean way
+    formatted_analysis = []
+    
+    if 'THREAT ASSESSMENT' in sections:
+        formatted_analysis.append('THREAT ASSESSMENT')
+        formatted_analysis.extend(sections['THREAT ASSESSMENT'])
+        formatted_analysis.append('')
+
+    if 'IMPACT ANALYSIS' in sections:
+        formatted_analysis.append('IMPACT ANALYSIS')
+        formatted_analysis.extend(sections['IMPACT ANALYSIS'])
+        formatted_analysis.append('')
+
+    if 'PREVENTION MEASURES' in sections:
+        formatted_analysis.append('PREVENTION MEASURES')
+        # Format prevention measures with proper numbering
+        measures = sections['PREVENTION MEASURES']
+        formatted_measures = []
+        for measure in measures:
+            if measure.startswith('[') and ']' in measure:
+                # Extract the number and text
+                number = measure[1:measure.index(']')]
+                text = measure[measure.index(']')+1:].strip()
+                formatted_measures.append(f"{number}. {text}")
+            else:
+                formatted_measures.append(measure)
+        formatted_analysis.extend(formatted_measures)
+
+    return {
+        "analysis": '\n'.join(formatted_analysis),
+        "commands": commands
+    }
+
+def _context_fields(context):
+    if isinstance(context, str):
+        try:
+            context = json.loads(context)
+        except ValueError:
+            return ''
+    if isinstance(context, dict):
+        return ','.join(sorted(map(str, context)))
+    return ''
+
+def group_anomalies(requests, max_size=SECURITY_GROUP_MAX_ANOMALIES):
+    """Group anomaly requests by severity and the feature that drove them.
+
+    Requests without a ``top_feature`` are grouped by the fields of their
+    context instead. Groups hold at most ``max_size`` anomalies so prompts
+    stay bounded. Returns a list of index lists into ``requests``, in
+    first-seen order.
+    """
+    groups = {}
+    for i, request in enumerate(requests):
+        key = (str(request.severity).strip().lower(), request.top_feature or _context_fields(request.context))
+        groups.setdefault(key, []).append(i)
+    return [
+        indices[start:start + max_size]
+        for indices in groups.values()
+        for start in range(0, len(indices), max_size)
+    ]
+
+def build_group_prompt(members):
+    """Create one prompt asking for a separate analysis of each anomaly in a group."""
+    if len(members) == 1:
+        return build_security_prompt(members[0])
+    anomalies = ''.join(
+        f"""
+    ANOMALY {number}
+    Context: {member.context}
+    Score: {member.score}
+    Confidence: {member.confidence}
+    Severity: {member.severity}
+"""
+        for number, member in enumerate(members, 1)
+    )
+    return f"""
+    Based on these {len(members)} related system log anomalies, provide specific Windows commands to address and mitigate the security issues of each one.
+
+    Input Data:
+{anomalies}
+    Analyze every anomaly separately. Start each analysis with a line "=== ANOMALY <number> ===" and then use this exact format:
+{ANALYSIS_FORMAT}
+    Note: Provide only Windows-compatible commands that directly address the detected anomaly.
+    Include specific parameters and values, not placeholders.
+    """
+
+def split_group_analysis(analysis, count):
+    """Split a multi-anomaly answer into ``count`` per-anomaly answers (None where missing)."""
+    parts = [None] * count
+    matches = list(_ANOMALY_HEADER.finditer(analysis))
+    for match, following in zip(matches, matches[1:] + [None]):
+        number = int(match.group(1))
+        if 1 <= number <= count:
+            text = analysis[match.end():following.start() if following else len(analysis)].strip()
+            parts[number - 1] = text or None
+    return parts
+
+async def _analyze_group(gateway, group_id, indices, requests, semaphore):
+    members = [requests[i] for i in indices]
+    keys = [
+        anomaly_fingerprint('security', member.context, member.severity, member.score)
+        for member in members
+    ]
+    # Answers are cached per anomaly; only the ones not seen before go into the prompt,
+    # and identical anomalies within the group are asked about once
+    answers = {key: gateway.lookup(key) for key in dict.fromkeys(keys)}
+    pending = [key for key, answer in answers.items() if answer is None]
+    if pending:
+        pending_members = [members[keys.index(key)] for key in pending]
+        async with semaphore:
+            try:
+                if len(pending) == 1:
+                    answers[pending[0]] = await gateway.generate(
+                        build_group_prompt(pending_members),
+                        cache_key=pending[0],
+                        safety_settings=SAFETY_SETTINGS
+                    )
+                else:
+                    analysis = await gateway.generate(
+                        build_group_prompt(pending_members),
+                        cache_key='group:' + ':'.join(pending),
+                        safety_settings=SAFETY_SETTINGS
+                    )
+                    for key, part in zip(pending, split_group_analysis(analysis or '', len(pending))):
+                        if part:
+                            gateway.store(key, part)
+                        answers[key] = part
+            except Exception as e:
+                logger.error(f"Error in batch security analysis: {str(e)}")
+                return group_id, indices, [error_security_analysis(member) for member in members]
+    results = [
+        parse_security_analysis(answers[key]) if answers[key] else default_security_analysis(member)
+        for key, member in zip(keys, members)
+    ]
+    return group_id, indices, results
+
+async def stream_security_batch(gateway, requests, max_parallel=SECURITY_BATCH_MAX_PARALLEL):
+    """Analyze many anomalies with one prompt per group, yielding NDJSON lines.
+
+    Each anomaly gets its own analysis, split out of its group's answer.
+    Groups run concurrently (at most ``max_parallel`` at a time) and each
+    anomaly's result is yielded as soon as its group finishes.
+    """
+    semaphore = asyncio.Semaphore(max_parallel)
+    tasks = [
+        asyncio.ensure_future(_analyze_group(gateway, group_id, indices, requests, semaphore))
+        for group_id, indices in enumerate(group_anomalies(requests))
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            group_id, indices, results = await next_done
+            for i, result in zip(indices, results):
+                yield json.dumps({
+                    "index": i,
+                    "group": group_id,
+                    "group_size": len(indices),
+                    **result
+                }) + "\n"
+    finally:
+        for task in tasks:
+            task.cancel()
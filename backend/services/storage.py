@@ -0,0 +1,118 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = os.getenv('UPLOAD_DIR', 'uploads')
+# Bytes read from an upload per chunk while hashing and writing it
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+class ContentStore:
+    """Stores uploads by the SHA-256 of their content.
+
+    Objects live at ``<root>/objects/<hash[:2]>/<hash><ext>``; the file
+    extension is kept because it decides how the log is parsed.
+    """
+
+    def __init__(self, root=UPLOAD_DIR):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.tmp_dir = os.path.join(root, 'tmp')
+
+    def object_path(self, content_hash, extension=''):
+        return os.path.join(self.objects_dir, content_hash[:2], f"{content_hash}{extension}")
+
+    async def store_upload(self, upload_file):
+        """Stream an UploadFile to disk in fixed-size chunks while hashing it.
+
+        Returns ``(path, content_hash)``. Identical content is stored once.
+        """
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        extension = os.path.splitext(upload_file.filename or '')[1].lower()
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as buffer:
+                while True:
+                    chunk = await upload_file.read(UPLOAD_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    buffer.write(chunk)
+
+            content_hash = digest.hexdigest()
+            path = self.object_path(content_hash, extension)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            return path, content_hash
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+class ResultCache:
+    """Analysis results on disk keyed by content hash, analyzer version and options."""
+
+    def __init__(self, root=os.path.join(UPLOAD_DIR, 'results')):
+        self.root = root
+
+    def _path(self, content_hash, version, options):
+        options_key = hashlib.sha256(
+            json.dumps(options or {}, sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()[:16]
+        return os.path.join(self.root, content_hash[:2], f"{content_hash}-v{version}-{options_key}.json")
+
+    def get(self, content_hash, version, options=None):
+        path = self._path(content_hash, version, options)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, content_hash, version, results, options=None):
+        path = self._path(content_hash, version, options)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'w') as f:
+            json.dump(results, f, default=str)
+        os.replace(tmp_path, path)
+
+content_store = ContentStore()
+result_cache = ResultCache()
+
+def cached_result(content_hash, options=None):
+    """Return the cached analysis for content under the current analyzer version."""
+    # The analyzer pulls in pandas; import it only once a result is needed
+    from services.log_analyzer import ANALYZER_VERSION
+
+    return result_cache.get(content_hash, ANALYZER_VERSION, options)
+
+def analyze_stored(path, content_hash, **options):
+    """Analyze a stored upload, reusing a cached result for the same content.
+
+    Source-scoped analyses update that source's model, so they always run.
+    """
+    from services.log_analyzer import ANALYZER_VERSION, analyze_logs
+
+    if options.get('source') is not None:
+        return analyze_logs(path, content_hash=content_hash, **options)
+    cached = result_cache.get(content_hash, ANALYZER_VERSION, options)
+    if cached is not None:
+        if 'metrics' in cached:
+            cached['metrics']['cached'] = True
+        return cached
+    results = analyze_logs(path, content_hash=content_hash, **options)
+    try:
+        result_cache.put(content_hash, ANALYZER_VERSION, results, options)
+    except (OSError, TypeError, ValueError) as e:
+        logger.error(f"Error caching analysis result: {str(e)}")
+    return results
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+from services.encoding import HashingEncoder, encoded_widths, encoder_fingerprint
+
+def test_each_value_sets_one_signed_feature():
+    features = HashingEncoder(n_buckets=8).fit_transform(['GET /', 'POST /login', 'GET /'])
+    assert features.shape == (3, 8)
+    assert np.array_equal(np.count_nonzero(features, axis=1), [1, 1, 1])
+    assert set(np.abs(features[features != 0])) == {1.0}
+    assert np.array_equal(features[0], features[2])
+
+def test_codes_are_stable_across_encoders_and_batches():
+    first = HashingEncoder(n_buckets=8).fit(['a', 'b']).transform(['c'])
+    second = HashingEncoder(n_buckets=8).fit(['x']).transform(['z', 'c'])
+    assert np.array_equal(first[0], second[1])
+
+def test_unseen_values_stay_on_the_unit_scale():
+    encoder = HashingEncoder(n_buckets=4).fit(['a', 'b'])
+    unseen = encoder.transform([f'never-seen-{i}' for i in range(100)])
+    assert np.array_equal(np.abs(unseen).sum(axis=1), np.ones(100))
+
+def test_colliding_values_share_a_bucket_without_a_numeric_jump():
+    encoder = HashingEncoder(n_buckets=2)
+    features = encoder.transform([f'value-{i}' for i in range(10)])
+    buckets = np.flatnonzero(features[:, 0])
+    # Ten values in two buckets must collide; colliding rows differ at most in sign
+    assert len(buckets) >= 2
+    assert np.array_equal(np.abs(features[buckets[0]]), np.abs(features[buckets[1]]))
+
+def test_rare_values_use_fit_time_counts():
+    encoder = HashingEncoder(n_buckets=8, min_count=2).fit(['a', 'a', 'b'])
+    alone = encoder.transform(['a'])
+    with_others = encoder.transform(pd.Series(['b', 'a', 'c', 'c', 'c']))
+    assert np.array_equal(alone[0], with_others[1])
+    assert not with_others[0].any()
+    # 'c' is frequent in this batch but was not when fitting
+    assert not with_others[2:].any()
+
+def test_widths_and_fingerprints():
+    encoders = {'message': HashingEncoder(n_buckets=16)}
+    assert encoded_widths(['cpu', 'message', 'level'], encoders) == [1, 16, 1]
+    assert encoder_fingerprint(HashingEncoder(min_count=2).fit(['a', 'a'])) != \
+        encoder_fingerprint(HashingEncoder(min_count=2).fit(['b', 'b']))
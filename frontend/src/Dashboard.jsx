@@ -152,7 +152,10 @@ const Dashboard = ({ analysisResults, loading, error }) => {
 
   // Prepare chart data
   const chartData = {
-    labels: Array.from({ length: analysisResults.anomaly_scores?.length || 0 }, (_, i) => i + 1),
+    // Downsampled series carry the window number of each point
+    labels: analysisResults.series_index
+      ? analysisResults.series_index.map((i) => i + 1)
+      : Array.from({ length: analysisResults.anomaly_scores?.length || 0 }, (_, i) => i + 1),
     datasets: [
       {
         label: 'Anomaly Scores',
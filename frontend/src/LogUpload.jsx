@@ -11,6 +11,9 @@ import {
 import { CloudUpload } from '@mui/icons-material';
 import axios from 'axios';
 
+// Score series are downsampled server-side to about this many chart points
+const MAX_CHART_POINTS = 2000;
+
 const LogUpload = ({ onAnalysisComplete }) => {
   const [selectedFile, setSelectedFile] = useState(null);
   const [loading, setLoading] = useState(false);
@@ -40,6 +43,7 @@ const LogUpload = ({ onAnalysisComplete }) => {
         headers: {
           'Content-Type': 'multipart/form-data',
         },
+        params: { max_points: MAX_CHART_POINTS },
         timeout: 60000,
       });
 